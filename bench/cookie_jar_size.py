@@ -0,0 +1,68 @@
+"""
+对比缓存的Cookie使用pickle和 utils.cookie_codec 序列化时的大小及耗时（user-005）
+
+使用与统一认证、综合门户、教务系统及实验系统登录后结构相同的8个Cookie，
+并检查解码后的Cookie发送到各系统时的Cookie请求头与原对象一致
+"""
+import harness  # noqa: F401  必须最先导入
+
+import pickle
+import time
+import timeit
+
+import requests
+from requests.cookies import RequestsCookieJar, create_cookie
+
+from utils import cookie_codec
+
+N = 5000
+
+# (名称, 值, 域名, 路径)
+cookies = [
+    ('TGC', 'TGT-1234567-abcdefghijklmnopqrstuvwxyzABCDEFGHIJ-cas', 'zhrz.nuc.edu.cn', '/cas'),
+    ('JSESSIONID', '0A1B2C3D4E5F60718293A4B5C6D7E8F9', 'zhrz.nuc.edu.cn', '/cas'),
+    ('SESSION', 'a1b2c3d4-e5f6-7890-abcd-ef0123456789', 'zhmh.nuc.edu.cn', '/'),
+    ('route', '5f1c0e2b8d3a4e6f', '.nuc.edu.cn', '/'),
+    ('JSESSIONID', '9F8E7D6C5B4A39281706F5E4D3C2B1A0', 'zhjw.nuc.edu.cn', '/jwglxt'),
+    ('BIGipServerjwxt', '1234567890.20480.0000', 'zhjw.nuc.edu.cn', '/'),
+    ('JSESSIONID', 'ABCDEF0123456789ABCDEF0123456789', 'sygl.nuc.edu.cn', '/'),
+    ('aexpsid', 'aexp-0123456789abcdef', 'sygl.nuc.edu.cn', '/'),
+]
+
+urls = [
+    'https://zhrz.nuc.edu.cn/cas/login',
+    'https://zhjw.nuc.edu.cn/jwglxt/cjcx/cjcx_cxDgXscj.html',
+    'http://sygl.nuc.edu.cn/teachn/teachnAction/index.action',
+]
+
+
+def timed(func) -> float:
+    return timeit.timeit(func, number=N) / N * 1e6
+
+
+def cookie_header(url: str, jar: RequestsCookieJar) -> str:
+    return requests.Request('GET', url, cookies=jar).prepare().headers.get('Cookie')
+
+
+def main():
+    jar = RequestsCookieJar()
+    for name, value, domain, path in cookies:
+        expires = int(time.time()) + 3600 if name == 'route' else None
+        jar.set_cookie(create_cookie(name, value, domain=domain, path=path, expires=expires))
+    pickled = pickle.dumps(jar)
+    encoded = cookie_codec.dumps(jar)
+    decoded = cookie_codec.loads(encoded)
+    # 旧的pickle格式仍可读取
+    assert cookie_codec.loads(pickled).get('aexpsid') == 'aexp-0123456789abcdef'
+    for url in urls:
+        assert cookie_header(url, decoded) == cookie_header(url, jar), url
+
+    print('大小: pickle %dB / cookie_codec %dB' % (len(pickled), len(encoded)))
+    print('序列化: pickle %.1fus / cookie_codec %.1fus' % (
+        timed(lambda: pickle.dumps(jar)), timed(lambda: cookie_codec.dumps(jar))))
+    print('反序列化: pickle %.1fus / cookie_codec %.1fus' % (
+        timed(lambda: pickle.loads(pickled)), timed(lambda: cookie_codec.loads(encoded))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+对比解码上游页面并查找登录标记的耗时（user-004）
+
+- 原实现：依次尝试 utf-8、gbk、gb2312、gb18030、latin1 解码整个页面，再查找标记
+- decode_response：按 Content-Type、<meta>、该主机上次成功的编码的顺序确定编码后解码
+- response_contains：编码已知时直接在原始字节中查找标记，不解码页面
+
+页面是按各上游页面的编码方式和大小构造的合成页面，结果以微秒/次输出
+"""
+import harness  # noqa: F401  必须最先导入
+
+import timeit
+
+from requests import Response
+
+from utils.session import decode_response, response_contains
+
+N = 300
+
+
+def page(encoding: str, marker: str, rows: int, declared: str = None) -> bytes:
+    meta = '<meta charset="{}">'.format(declared) if declared else ''
+    rows = '<tr><td>ascii filler row</td><td>实验课程 中北大学</td></tr>' * rows
+    return '<html><head>{}</head><body>{}{}</body></html>'.format(meta, rows, marker).encode(encoding)
+
+
+def make_response(url: str, content: bytes, content_type: str) -> Response:
+    response = Response()
+    response.url = url
+    response.status_code = 200
+    response.headers['Content-Type'] = content_type
+    response._content = content
+    return response
+
+
+def baseline_decode(response: Response) -> str:
+    """原各模块中逐个尝试编码的解码方式"""
+    for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
+        try:
+            return response.content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+
+# 名称 -> (URL, 页面内容, Content-Type, 登录标记)
+pages = {
+    'zhjw, utf-8 响应头': ('https://zhjw.nuc.edu.cn/jwglxt/xtgl/index_initMenu.html',
+                         page('utf-8', '教学管理信息服务平台', 2000), 'text/html;charset=UTF-8', '教学管理信息服务平台'),
+    'sygl, gb2312 meta': ('http://sygl.nuc.edu.cn/teachn/teachnAction/index.action',
+                          page('gbk', '实验教学管理平台', 2000, 'gb2312'), 'text/html', '实验教学管理平台'),
+    'library, gbk 未声明': ('http://222.31.39.3:8080/opac/search.php',
+                          page('gbk', '共12条记录', 500), 'text/html', '共12条记录'),
+}
+
+
+def main():
+    for label, (url, content, content_type, marker) in pages.items():
+        def timed(func):
+            return timeit.timeit(lambda: func(make_response(url, content, content_type)), number=N) / N * 1e6
+
+        assert marker in decode_response(make_response(url, content, content_type))
+        assert response_contains(make_response(url, content, content_type), marker)
+        print('%s, %dKB: 原实现 %.0fus / decode_response %.0fus / response_contains %.0fus' % (
+            label, len(content) // 1024,
+            timed(lambda response: marker in baseline_decode(response)),
+            timed(decode_response),
+            timed(lambda response: response_contains(response, marker))))
+
+
+if __name__ == '__main__':
+    main()
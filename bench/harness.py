@@ -0,0 +1,88 @@
+"""
+基准测试及本地替身的公共环境
+
+使用 fakeredis 代替 Redis 服务，使 utils.redis_connections 中的各连接共享同一个内存中的 Redis，
+脚本无需连接真实的 Redis 及校内系统即可运行。额外的依赖见 bench/requirements.txt：
+
+    pip install -r bench/requirements.txt
+
+各脚本在项目根目录下以 python bench/<脚本名>.py 运行，必须在导入项目模块之前导入本模块
+"""
+import io
+import os
+import sys
+from urllib.parse import urlsplit
+
+from gevent import monkey
+
+monkey.patch_all()
+
+import fakeredis  # noqa: E402
+import redis  # noqa: E402
+from requests.models import Response  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_server = fakeredis.FakeServer()
+
+
+class FakeStrictRedis(fakeredis.FakeStrictRedis):
+    """忽略连接参数，所有连接共享同一个 fakeredis 服务"""
+
+    def __init__(self, *args, **kwargs):
+        for key in ('host', 'port', 'password', 'username'):
+            kwargs.pop(key, None)
+        super().__init__(*args, server=_server, **kwargs)
+
+
+redis.StrictRedis = FakeStrictRedis
+redis.Redis = FakeStrictRedis
+
+
+class StandInAdapter:
+    """
+    代替校内系统的连接适配器，由 respond 根据请求构造响应，并记录每个请求的主机和路径
+
+    使用 mount_stand_in 挂载到 utils.session 中的会话后，所有上游请求都由本适配器处理
+    """
+
+    def __init__(self, respond):
+        """
+        :param respond: 根据请求返回 (状态码, 响应头, 响应体, 设置的Cookie字典) 的函数
+        """
+        self.respond = respond
+        self.calls = []
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        self.calls.append((parts.hostname, parts.path))
+        status, headers, body, cookies = self.respond(request)
+        response = Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = status
+        response.headers.update(headers)
+        response.headers.setdefault('Content-Type', 'text/html; charset=utf-8')
+        response._content = body
+        response.raw = io.BytesIO(body)
+        for name, value in (cookies or {}).items():
+            response.cookies.set(name, value, domain=parts.hostname, path='/')
+        return response
+
+    def close(self):
+        pass
+
+
+def mount_stand_in(respond) -> StandInAdapter:
+    """
+    用替身代替 utils.session 中会话挂载的全部适配器
+
+    :param respond: 见 StandInAdapter
+    :return: 替身适配器，calls 为收到的请求
+    """
+    from utils.session import session
+
+    adapter = StandInAdapter(respond)
+    for prefix in list(session.adapters):
+        session.mount(prefix, adapter)
+    return adapter
@@ -0,0 +1,58 @@
+"""
+统计实验系统单点登录访问上游的次数（user-010）
+
+使用替身代替统一认证及实验系统，按实验系统签发 aexpsid 的时机分两种情况：
+- session: 访问带jsessionid的URL时签发，快速路径即可完成登录
+- student_index: 访问学生首页时才签发，快速路径校验失败后改用完整流程，并在冷却时间内直接使用完整流程
+
+每种情况连续登录两次，输出每次的上游请求数及各步骤的耗时统计
+"""
+import harness  # noqa: F401  必须最先导入
+
+from requests.cookies import RequestsCookieJar
+
+from plugins_v3._login import login as login_module
+from utils import metrics
+
+
+def stand_in(aexpsid_at: str):
+    def respond(request):
+        url = request.url
+        cookie = request.headers.get('Cookie', '')
+        if url.startswith('https://zhrz.nuc.edu.cn/'):
+            return 302, {'Location': 'http://sygl.nuc.edu.cn/nuc/?ticket=ST-1'}, b'', None
+        if 'ticket=' in url:
+            return 302, {'Location': 'http://sygl.nuc.edu.cn/nuc/;jsessionid=j'}, b'', {'JSESSIONID': 'j'}
+        if 'jsessionid=' in url:
+            cookies = {'aexpsid': 'a'} if aexpsid_at == 'session' else None
+            return 302, {'Location': 'http://sygl.nuc.edu.cn/aexp/stuIndex.jsp'}, b'', cookies
+        if url.endswith('/aexp/stuIndex.jsp'):
+            return 200, {}, b'', {'aexpsid': 'a'} if aexpsid_at == 'student_index' else None
+        if '/teachn/' in url:
+            if 'aexpsid=a' in cookie:
+                return 200, {}, '实验教学管理平台'.encode(), None
+            return 302, {'Location': 'http://sygl.nuc.edu.cn/nuc/'}, b'', None
+        if url.endswith('/nuc/'):
+            location = 'https://zhrz.nuc.edu.cn/cas/login?service=http%3A%2F%2Fsygl.nuc.edu.cn%2Fnuc%2F'
+            return 302, {'Location': location}, b'', None
+        return 200, {}, b'', None
+
+    return respond
+
+
+def main():
+    auth_cookies = RequestsCookieJar()
+    auth_cookies.set('TGC', 'ok', domain='zhrz.nuc.edu.cn', path='/')
+    for aexpsid_at in ('session', 'student_index'):
+        adapter = harness.mount_stand_in(stand_in(aexpsid_at))
+        login_module._lab_fast_disabled_until = 0.0
+        for attempt in (1, 2):
+            adapter.calls.clear()
+            cookies = login_module.get_lab_cookie(auth_cookies)
+            assert cookies is not None and cookies.get('aexpsid') == 'a'
+            print('aexpsid 签发于 %s，第 %d 次登录: 上游请求 %d 次' % (aexpsid_at, attempt, len(adapter.calls)))
+    print({key: round(value, 2) for key, value in metrics.snapshot('lab_sso').items() if not key.endswith('.sum')})
+
+
+if __name__ == '__main__':
+    main()
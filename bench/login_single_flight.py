@@ -0,0 +1,82 @@
+"""
+检查跨进程合并登录时，等待者只会拿到同一组凭证的登录结果
+
+模拟另一个进程正持有某组凭证的登录锁：
+1. 对方使用错误密码登录失败（不发布结果），等待者不能拿到该学号缓存的会话，应自行登录并得到失败原因
+2. 对方使用相同密码登录成功并发布结果，等待者直接使用该结果，不再访问统一认证系统
+3. 禁用缓存的登录（/v3/login）即使对方发布了结果也自行登录
+"""
+import harness  # noqa: F401  必须最先导入
+
+import gevent
+from requests.cookies import RequestsCookieJar
+
+from plugins_v3._login import login as login_module
+from utils import cookie_codec
+from utils.exceptions import CustomHTTPException
+from utils.redis_connections import redis_session
+
+NAME = 'VICTIM01'
+upstream_calls = []
+
+
+def fake_re_login(re_url, e_url, name, passwd):
+    upstream_calls.append(passwd)
+    if passwd != 'rightpw':
+        login_module.custom_abort(-3, '用户名或密码错误')
+    jar = RequestsCookieJar()
+    jar.set('CASTGC', 'fresh-' + passwd)
+    return None, jar
+
+
+login_module.re_login = fake_re_login
+login_module.check_login = lambda cookies, login_response: cookies
+login_module.follow_link = lambda cookies, url: (None, cookies)
+login_module.check_login_failure = lambda name, passwd: None
+login_module.cache_login_failure = lambda name, passwd, message: None
+
+
+def hold_lock(passwd: str, publish=None, seconds=0.5):
+    """模拟另一个进程持有该组凭证的登录锁，结束时可选地发布结果"""
+    key = "login" + login_module.flight_id(NAME, passwd) + "1"
+    redis_session.set("lock:" + key, 'other-worker', ex=30)
+
+    def release():
+        gevent.sleep(seconds)
+        if publish is not None:
+            redis_session.set("result:" + key, cookie_codec.dumps(publish), ex=30)
+        redis_session.delete("lock:" + key)
+
+    return gevent.spawn(release)
+
+
+def main():
+    victim = RequestsCookieJar()
+    victim.set('CASTGC', 'victim-session')
+    redis_session.set("cookie" + NAME, cookie_codec.dumps(victim))
+
+    hold_lock('wrongpw')
+    try:
+        cookies = login_module.login(NAME, 'wrongpw', True)
+        raise AssertionError('错误密码拿到了会话: %s' % dict(cookies))
+    except CustomHTTPException as e:
+        print('错误密码: 自行登录并失败 -> %s，上游请求 %s 次' % (e.message, len(upstream_calls)))
+    assert upstream_calls == ['wrongpw']
+
+    published = RequestsCookieJar()
+    published.set('CASTGC', 'published')
+    upstream_calls.clear()
+    redis_session.delete("cookie" + NAME)
+    hold_lock('rightpw', publish=published)
+    cookies = login_module.login.__wrapped__(NAME, 'rightpw')
+    assert cookies.get('CASTGC') == 'published' and not upstream_calls
+    print('相同密码: 使用对方发布的结果，上游请求 0 次')
+
+    hold_lock('rightpw', publish=published)
+    cookies = login_module.login(NAME, 'rightpw', True)
+    assert cookies.get('CASTGC') == 'fresh-rightpw' and upstream_calls == ['rightpw']
+    print('禁用缓存: 不使用对方发布的结果，自行登录')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+统计一次 /v3/physical 查询访问上游的次数（user-009）
+
+使用替身代替统一认证及体育系统：携带有效的统一认证Cookie访问体育系统的CAS入口时直接签发ticket，
+体育系统凭ticket设置JSESSIONID，接口只接受携带该Cookie的请求。依次模拟：
+1. 统一认证会话已缓存、体育系统会话未缓存时的首次查询
+2. 信任窗口内的后续查询
+3. 体育系统会话超出信任窗口后的查询
+"""
+import harness  # noqa: F401  必须最先导入
+
+import json
+import time
+from collections import Counter
+
+from requests.cookies import RequestsCookieJar
+
+from plugins_v3._login import login as login_module
+from plugins_v3.physical import config as physical_config
+from utils.redis_connections import redis_session
+
+NAME = 'u1'
+
+
+def respond(request):
+    cookie = request.headers.get('Cookie', '')
+    host = request.url.split('/')[2]
+    if host == 'zhrz.nuc.edu.cn':
+        if 'TGC=ok' in cookie:
+            return 302, {'Location': 'http://tygl.nuc.edu.cn/admin/mainzbsso/admin/login?ticket=ST-1'}, b'', None
+        return 200, {}, '<html>统一身份认证</html>'.encode(), None
+    if 'ticket=' in request.url:
+        return 200, {}, b'<html>ok</html>', {'JSESSIONID': 'ty'}
+    if 'JSESSIONID=ty' not in cookie:
+        return 302, {'Location': 'https://zhrz.nuc.edu.cn/cas/login'}, b'', None
+    body = json.dumps({'data': [{'sysUser': {'id': 1}}], 'returnCode': '200'}).encode()
+    return 200, {'Content-Type': 'application/json'}, body, None
+
+
+def physical():
+    # 与 plugins_v3.physical 中的查询相同：先获取用户ID，再查询成绩
+    response = login_module.physical_request('POST', physical_config.sys_url, NAME, 'passwd')
+    user_id = response.json()['data'][0]['sysUser']['id']
+    return login_module.physical_request('POST', physical_config.index_url, NAME, 'passwd', data={'userId': user_id})
+
+
+def main():
+    stand_in = harness.mount_stand_in(respond)
+    # 已缓存且在信任窗口内的统一认证会话
+    jar = RequestsCookieJar()
+    jar.set('TGC', 'ok', domain='zhrz.nuc.edu.cn', path='/cas')
+    login_module.zhjw_sessions.save(NAME, jar)
+
+    def run(label):
+        stand_in.calls.clear()
+        physical()
+        print('%s: 上游请求 %d 次 %s' % (label, len(stand_in.calls), dict(Counter(host for host, _ in stand_in.calls))))
+
+    run('首次查询')
+    run('信任窗口内')
+    redis_session.set(login_module.tygl_sessions.validated_prefix + NAME, time.time() - 86400)
+    run('超出信任窗口')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+对比统一认证登录时密码加密的耗时（user-003）
+
+- 原实现：每次加密都重新构建公钥对象，并逐字节拼接填充
+- 公钥缓存：清空密文缓存，只复用公钥对象
+- 密文缓存：同一公钥和密码再次加密
+
+使用CAS实际下发的512位公钥，结果以微秒/次输出
+"""
+import harness  # noqa: F401  必须最先导入
+
+import timeit
+
+import rsa
+
+from utils import myrsa
+
+# CAS登录页下发的公钥指数和模数
+E = '10001'
+M = 'e9a315bf6d72428bf7d03d52f2f12418f3ed692703f572650d9f996b68be21fedb48805228619574a9df13393f6ea06ae929f64a88fd1edaf4489016caa5d779'
+PASSWORD = '%B7abc123'[::-1]
+N = 20000
+
+
+def baseline_encrypt(e: str, m: str, message: str) -> str:
+    """原 utils.myrsa.Encrypt 的实现"""
+    pub_key = rsa.PublicKey(int(m, 16), int(e, 16))
+    keylength = rsa.common.byte_size(pub_key.n)
+    message = message.encode()[::-1]
+    padding = b''
+    for _ in range(keylength - len(message) - 3):
+        padding += b'\x00'
+    padded = b''.join([b'\x00\x00', padding, b'\x00', message])
+    encrypted = rsa.core.encrypt_int(rsa.transform.bytes2int(padded), pub_key.e, pub_key.n)
+    return rsa.transform.int2bytes(encrypted, keylength).hex()
+
+
+def key_cached():
+    myrsa._cipher_cache.clear()
+    myrsa.Encrypt(E, M).encrypt(PASSWORD)
+
+
+def main():
+    assert baseline_encrypt(E, M, PASSWORD) == myrsa.Encrypt(E, M).encrypt(PASSWORD)
+    timings = [
+        ('原实现', lambda: baseline_encrypt(E, M, PASSWORD)),
+        ('公钥缓存', key_cached),
+        ('密文缓存', lambda: myrsa.Encrypt(E, M).encrypt(PASSWORD)),
+    ]
+    for label, func in timings:
+        print('%s: %.1fus' % (label, timeit.timeit(func, number=N) / N * 1e6))
+
+
+if __name__ == '__main__':
+    main()
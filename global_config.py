@@ -23,6 +23,9 @@ PHONE = [""]
 # 黑名单用户
 blacklist = ['']  # 存储被拉黑用户的openid列表
 
+# 计算密码摘要使用的盐值，多进程部署时应配置为相同的值；未配置时自动生成并保存在Redis中
+credential_salt = os.getenv('CREDENTIAL_SALT')
+
 # 网络配置
 # 代理服务器(本地运行可不配置)
 proxyIp = os.getenv('PROXY_IP')  # socks代理地址
@@ -68,12 +71,83 @@ if proxy_list:
 else:
     logging.warning("未配置任何代理")
 
-# 代理轮询策略: 'round_robin'(默认轮询), 'random'(随机选择)
-proxy_rotation_policy = 'round_robin'
+# 代理选择策略，每次上游请求按此策略选择代理:
+# 'round_robin'(使用当前代理，保活失败时切换到下一个), 'random'(随机选择),
+# 'ewma'(按延迟和失败率加权随机选择), 'least_in_flight'(选择正在进行的请求最少的代理),
+# 'sticky'(每个上游系统固定使用一个代理，失败后重新选择)
+proxy_rotation_policy = 'ewma'
+# 代理延迟和失败率指数加权平均的平滑系数，越大越看重最近的请求
+proxy_ewma_alpha = 0.2
 
 # 代理请求超时时间(秒)
 proxy_request_timeout = 10
 
+# 代理管理器中每个代理会话的连接池大小
+proxy_pool_maxsize = 10
+
+# 代理健康探测配置
+# 保活任务并发探测每个代理到以下各上游系统的连通性，结果用于代理选择，键与 upstream_clients 一致
+proxy_probe_targets = {
+    'cas': 'https://zhrz.nuc.edu.cn/cas/login',
+    'jwxt': 'https://zhjw.nuc.edu.cn/jwglxt/xtgl/index_initMenu.html',
+    'lab': 'http://sygl.nuc.edu.cn/nuc/',
+    'tygl': 'http://tygl.nuc.edu.cn/admin/mainzbsso',
+    'library': 'http://222.31.39.3:8080/pft/showmarc/table.asp',
+}
+# 探测间隔(秒)，探测成功时间隔加倍直到最大值，失败时恢复为最小值
+proxy_probe_min_interval = 5
+proxy_probe_max_interval = 120
+# 探测请求超时时间(秒)
+proxy_probe_timeout = 10
+
+# 单个请求的总耗时上限(秒)，登录及查询过程中的每次上游请求只能使用剩余的时间
+request_deadline = 20
+
+# 熔断配置
+# 同一主机连续失败多少次后打开熔断器，打开期间直接拒绝请求
+circuit_breaker_failures = 5
+# 熔断器打开多少秒后放行一个探测请求
+circuit_breaker_recovery = 30
+
+# 上游系统连接配置
+# 每个上游系统使用独立的连接池，hosts 为该系统的主机（可带端口），未列出的主机使用 default 配置
+# pool_maxsize: 每个主机保持的最大连接数; pool_block: 连接池用尽时是否等待空闲连接（否则临时新建连接）
+# timeout: 默认超时时间(秒)，(连接超时, 读取超时); retries: 幂等请求连接失败时的重试次数
+# backoff: 重试间隔的指数退避系数(秒)，默认0.2，实际间隔在 0 到退避时间之间随机
+# headers: 默认请求头，请求中已设置的同名请求头优先
+# http_cache: 启用HTTP条件请求缓存的路径前缀，缓存响应的 ETag/Last-Modified 和内容，再次请求时上游返回304则使用缓存的内容；
+#             只用于无需登录的公开页面，携带Cookie的请求不会被缓存
+upstream_clients = {
+    'default': {'hosts': [], 'pool_maxsize': 10, 'timeout': (5, 10), 'retries': 3},
+    'cas': {'hosts': ['zhrz.nuc.edu.cn', 'zhmh.nuc.edu.cn'], 'pool_maxsize': 50, 'timeout': (5, 10), 'retries': 3},
+    'jwxt': {'hosts': ['zhjw.nuc.edu.cn'], 'pool_maxsize': 50, 'timeout': (5, 15), 'retries': 3},
+    'lab': {'hosts': ['sygl.nuc.edu.cn', '222.31.49.141'], 'pool_maxsize': 20, 'timeout': (5, 15), 'retries': 3},
+    'tygl': {'hosts': ['tygl.nuc.edu.cn'], 'pool_maxsize': 10, 'timeout': (5, 10), 'retries': 3},
+    'library': {'hosts': ['222.31.39.3:8080'], 'pool_maxsize': 20, 'timeout': (5, 15), 'retries': 3,
+                'http_cache': ['/pft/showmarc/table.asp', '/pft/showmarc/showbookitems.asp']},
+    'douban': {'hosts': ['api.douban.com'], 'pool_maxsize': 10, 'timeout': (3, 5), 'retries': 1},
+    'wechat': {'hosts': ['api.weixin.qq.com'], 'pool_maxsize': 10, 'timeout': (3, 5), 'retries': 1},
+}
+
+# 请求对冲配置（仅用于显式启用对冲的幂等查询请求）
+# 请求在该主机最近耗时的 hedge_percentile 分位数内未返回时，再发出一次相同的请求，采用先返回的结果
+hedge_percentile = 0.95
+# 至少积累多少个耗时样本后才开始对冲
+hedge_min_samples = 20
+# 发出对冲请求前的最短等待时间(秒)
+hedge_min_delay = 0.2
+# 对冲请求数占请求总数的最大比例，避免上游变慢时成倍增加请求量
+hedge_max_ratio = 0.05
+
+# 接口缓存的进程内缓存配置
+# 每个接口进程内缓存的默认最大条目数，可通过 cache(..., local_size=) 单独设置
+local_cache_size = 256
+# 进程内缓存的最长有效期(秒)，限制未收到失效通知时可能返回旧数据的时间
+local_cache_max_ttl = 60
+
+# HTTP条件请求缓存的过期时间(秒)，每次上游返回304时顺延
+http_cache_expire = 604800
+
 # 代理失败后重试延迟(秒)
 proxy_retry_delay = 0.5
 
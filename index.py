@@ -4,24 +4,7 @@ import gevent.monkey
 gevent.monkey.patch_all()
 
 # from global_config import mysql as mysql_config, blacklist, proxyIp
-from global_config import proxy_list, enableProxy
-
-import os
-# 环境变量代理设置移至 proxy_manager 统一管理
-if enableProxy and proxy_list:
-    # 找出第一个socks5代理作为全局代理
-    for proxy in proxy_list:
-        if proxy.get('type', '').lower() == 'socks5' and proxy.get('url'):
-            # 设置全局代理，用于访问校内网络资源
-            os.environ["http_proxy"] = "socks5://" + proxy['url']
-            os.environ["https_proxy"] = "socks5://" + proxy['url']
-            break
-else:
-    # 如果禁用代理或代理列表为空，则清除环境变量中的代理设置
-    if "http_proxy" in os.environ:
-        del os.environ["http_proxy"]
-    if "https_proxy" in os.environ:
-        del os.environ["https_proxy"]
+# 上游请求的代理由 utils.proxy_manager 统一管理，每个代理使用独立的连接池
 
 import requests
 import json
@@ -37,6 +20,8 @@ from utils.gol import global_values
 from utils.logger import root_logger
 from utils.scheduler import scheduler
 from utils.exceptions import CustomHTTPException
+from utils import deadline
+from global_config import request_deadline
 import signal
 import sys
 
@@ -62,6 +47,8 @@ db.init_app(app)
 @app.before_request
 def before_request():
     g.values = {'code': 0}
+    # 设置本次请求的总耗时上限
+    deadline.start(request_deadline)
 
 # 添加根路由处理
 @app.route('/')
@@ -76,6 +63,12 @@ def index():
 def on_custom_http_exception(e: CustomHTTPException):
     # 将错误码存储到全局变量中
     g.values['code'] = e.code
+    # 超时后的失败可能已被中间的异常处理改写，统一返回超时信息
+    if e.code == -1 and deadline.expired():
+        return {
+            'code': -1,
+            'message': deadline.message()
+        }
     return {
         'code': e.code,
         'message': e.message
@@ -85,6 +78,14 @@ def on_custom_http_exception(e: CustomHTTPException):
 # 全局异常处理器
 @app.errorhandler(Exception)
 def on_sever_error(e):
+    # 处理超过总耗时上限的请求
+    if isinstance(e, requests.exceptions.ReadTimeout) or deadline.expired():
+        g.values['code'] = -1
+        logging.warning("请求 %s 超时: %s", request.path, e)
+        return {
+            'code': -1,
+            'message': deadline.message()
+        }
     # 处理连接错误（通常是VPN或代理问题）
     if isinstance(e, requests.exceptions.ConnectionError):
         g.values['code'] = -1
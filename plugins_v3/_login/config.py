@@ -23,3 +23,75 @@ e_experiment_url = "/cas/login?service=http%3A%2F%2F222.31.49.141%2Fnuc%2F&" \
 # 体育系统登录异常时的重定向URL
 e_physical_url = "/cas/login?service=http%3A%2F%2Ftygl.nuc.edu.cn%2Fadmin%2Fmainzbsso%2Fadmin%2Flogin&" \
                  "exception.message=Error+decoding+flow+execution"
+
+# 统一认证及教务系统Cookie在Redis中的默认缓存时间（秒），寿命样本充足后改用估计值
+cookie_expire = 21600
+# 实验系统Cookie在Redis中的默认缓存时间（秒），寿命样本充足后改用估计值
+experiment_cookie_expire = 21600
+# 体育系统Cookie在Redis中的默认缓存时间（秒），寿命样本充足后改用估计值
+physical_cookie_expire = 21600
+# Cookie校验信任窗口（秒），在此时间内使用缓存的Cookie不再发起校验请求，同时也是估计值的上限
+cookie_trust_window = 300
+# 合并并发登录时Redis锁的过期时间（秒），应大于一次完整登录的耗时
+login_lock_ttl = 30
+# 等待其他协程或进程完成登录的最长时间（秒），超时后自行登录
+login_wait_timeout = 30
+
+# 后台会话刷新配置
+# 记录活跃账号的Redis有序集合键名（redis_session中），分数为最近活跃时间
+active_sessions_key = "active_sessions"
+# 账号在最近多少秒内有请求才视为活跃并参与后台刷新
+session_active_window = 1800
+# 后台刷新任务的执行间隔（秒）
+session_refresh_interval = 60
+# 会话距上次校验超过多少秒后由后台刷新，应小于上游会话的空闲超时时间
+session_refresh_age = 1200
+# 后台刷新的最大并发数
+session_refresh_concurrency = 4
+# 每次刷新任务最多刷新的会话数，避免挤占用户请求的上游资源
+session_refresh_budget = 50
+
+# 会话寿命估计配置
+# 每个上游最多保留的寿命样本数
+lifetime_max_samples = 500
+# 观察到的失效样本达到此数量后才使用估计值
+lifetime_min_samples = 20
+# 估计结果在进程内的缓存时间（秒）
+lifetime_estimate_interval = 60
+# 缓存时间取此累计失效概率对应的寿命
+lifetime_ttl_percentile = 0.9
+# 估计的缓存时间范围（秒）
+lifetime_min_ttl = 600
+lifetime_max_ttl = 86400
+# 信任窗口取此累计失效概率对应寿命的 lifetime_trust_ratio 倍
+lifetime_trust_percentile = 0.1
+lifetime_trust_ratio = 0.5
+# 估计的信任窗口下限（秒）
+lifetime_min_trust_window = 30
+
+# 登录失败缓存配置
+# 出现以下失败原因时缓存结果，相同凭证在有效期内重试直接返回失败
+login_failure_messages = ['账号或密码错误!', '请修改密码!', '未绑定手机号!', '无权登录此账号!']
+# 登录失败结果的缓存时间（秒）
+login_failure_ttl = 300
+
+# 登录流程预热配置
+# 预先打开CAS登录流程（登录页Cookie、execution及公钥）的登录页URL，登录时直接提交账号密码
+login_flow_pool_urls = [index_url]
+# 每个登录页保留的预热流程数量
+login_flow_pool_size = 4
+# 后台补充预热流程的间隔（秒）
+login_flow_refill_interval = 30
+# 预热流程的最大可用时长（秒），流程被CAS拒绝时会在此范围内自动收紧
+login_flow_max_age = 300
+login_flow_min_age = 30
+
+# 令牌配置
+# 令牌的有效期（秒），每次使用后顺延
+token_expire = 604800
+# 每个学生最多保留的令牌数量，超出时撤销最早签发的令牌
+token_max_per_user = 10
+
+# 凭证摘要配置
+# 密码与最近一次验证通过的一致时登录接口直接返回，距上次验证超过此时间（秒）则在后台重新验证密码
+credential_revalidate_interval = 600
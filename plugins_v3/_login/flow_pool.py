@@ -0,0 +1,160 @@
+import logging
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import gevent
+import requests
+
+from plugins_v3._login import config
+from utils import metrics
+from utils.exceptions import custom_abort
+from utils.session import session, decode_response
+
+# 预先准备好的登录流程，登录页URL -> 按创建时间排列的流程队列
+_pools: Dict[str, Deque[dict]] = {}
+# 各登录页流程的最大可用时长（秒），根据流程被拒绝时的时长动态调整
+_max_age: Dict[str, float] = {}
+# 正在补充流程的登录页URL
+_refilling = set()
+
+
+def open_flow(re_url: str) -> dict:
+    """
+    打开一个新的CAS登录流程：获取登录页的Cookie和execution，以及加密密码用的RSA公钥
+
+    :param re_url: 统一认证登录页URL
+    :return: 登录流程，包含 url、cookies、execution、public_key、created
+    """
+    index_response = session.get(re_url)
+    if not index_response.ok:
+        logging.error(f"Failed to get login page, status code: {index_response.status_code}")
+        custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
+
+    content = decode_response(index_response)
+    if not content:
+        logging.error("无法解码登录页面响应内容")
+        custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
+
+    if content.find("Loading...") != -1:
+        custom_abort(-1, 'VPN通道已关闭!')
+
+    # Check if we got a valid response with the execution value
+    execution_match = re.search('name="execution" value="(.*?)"', content)
+    if not execution_match:
+        # Log the response content for debugging
+        logging.error(f"Failed to find execution value in response. Content: {content[:200]}...")
+        custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
+
+    cookies = index_response.cookies
+    try:
+        public_key_dict_resp = session.get(config.public_key_url, cookies=cookies)
+        cookies.update(public_key_dict_resp.cookies)
+        public_key_dict = public_key_dict_resp.json()
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        # 连接失败（包括熔断器拒绝）及超时交由调用方处理，不当作密钥解析失败
+        raise
+    except Exception as e:
+        logging.error(f"Failed to get public key: {str(e)}")
+        custom_abort(-1, '获取登录密钥失败，请稍后再试!')
+
+    return {
+        'url': re_url,
+        'cookies': cookies,
+        'execution': execution_match.group(1),
+        'public_key': public_key_dict,
+        'created': time.time(),
+        'pooled': False,
+    }
+
+
+def max_age(re_url: str) -> float:
+    """
+    :param re_url: 统一认证登录页URL
+    :return: 该登录页流程当前的最大可用时长（秒）
+    """
+    return _max_age.get(re_url, config.login_flow_max_age)
+
+
+def take(re_url: str) -> Optional[dict]:
+    """
+    从池中取出一个未过期的登录流程，每个流程只会被使用一次
+
+    池中流程不足时在后台补充
+
+    :param re_url: 统一认证登录页URL
+    :return: 登录流程，池为空或该登录页未启用预热时返回None
+    """
+    if re_url not in config.login_flow_pool_urls:
+        return None
+    pool = _pools.setdefault(re_url, deque())
+    now = time.time()
+    flow = None
+    while pool:
+        candidate = pool.popleft()
+        if now - candidate['created'] < max_age(re_url):
+            flow = candidate
+            break
+        metrics.incr('login_flow_pool.expired')
+    if len(pool) < config.login_flow_pool_size and re_url not in _refilling:
+        gevent.spawn(refill, re_url)
+    if flow is None:
+        metrics.incr('login_flow_pool.miss')
+        return None
+    metrics.incr('login_flow_pool.hit')
+    metrics.observe('login_flow_pool.age', now - flow['created'])
+    return flow
+
+
+def accepted(flow: dict):
+    """
+    记录池中的流程被CAS接受，接受时的时长接近上限时逐步放宽上限
+
+    :param flow: 登录流程
+    """
+    if not flow['pooled']:
+        return
+    age = time.time() - flow['created']
+    limit = max_age(flow['url'])
+    if age > limit / 2:
+        _max_age[flow['url']] = min(limit * 1.1, config.login_flow_max_age)
+
+
+def rejected(flow: dict):
+    """
+    记录池中的流程被CAS拒绝（execution已失效），按被拒绝时的时长收紧上限
+
+    :param flow: 登录流程
+    """
+    if not flow['pooled']:
+        return
+    age = time.time() - flow['created']
+    metrics.incr('login_flow_pool.rejected')
+    _max_age[flow['url']] = max(min(age * 0.8, max_age(flow['url'])), config.login_flow_min_age)
+    logging.info("预热的登录流程在 %.0f 秒后被拒绝，最大可用时长调整为 %.0f 秒", age, _max_age[flow['url']])
+
+
+def refill(re_url: str):
+    """
+    清理过期的流程，并将池补充到 login_flow_pool_size 个
+
+    :param re_url: 统一认证登录页URL
+    """
+    if re_url in _refilling:
+        return
+    _refilling.add(re_url)
+    try:
+        pool = _pools.setdefault(re_url, deque())
+        now = time.time()
+        while pool and now - pool[0]['created'] >= max_age(re_url):
+            pool.popleft()
+            metrics.incr('login_flow_pool.expired')
+        while len(pool) < config.login_flow_pool_size:
+            flow = open_flow(re_url)
+            flow['pooled'] = True
+            pool.append(flow)
+    except Exception as e:
+        logging.warning("预热登录流程失败: %s", e)
+    finally:
+        _refilling.discard(re_url)
@@ -0,0 +1,169 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from plugins_v3._login import config
+from utils.redis_connections import redis_session
+
+# 需要估计会话寿命的上游系统
+upstreams = ('zhjw', 'sygl', 'tygl')
+
+# 各上游样本不足时使用的默认缓存时间（秒）
+_default_ttl = {
+    'zhjw': config.cookie_expire,
+    'sygl': config.experiment_cookie_expire,
+    'tygl': config.physical_cookie_expire,
+}
+
+# 各上游寿命估计的进程内缓存，upstream -> (计算时间, 估计结果)
+_estimates: Dict[str, Tuple[float, dict]] = {}
+
+
+def _session_key(upstream: str, name: str) -> str:
+    return "issued:" + upstream + ":" + name
+
+
+def _samples_key(upstream: str) -> str:
+    return "lifetime:" + upstream
+
+
+def record_issued(upstream: str, name: str):
+    """
+    记录一次新会话的签发时间
+
+    若该账号上一个会话未被观察到失效就被替换，则以其最后一次确认有效时的寿命作为截尾样本
+
+    :param upstream: 上游系统
+    :param name: 学号
+    """
+    now = time.time()
+    previous = redis_session.hgetall(_session_key(upstream, name))
+    pipe = redis_session.pipeline()
+    if float(previous.get(b'alive', 0)) > 0:
+        _push_sample(pipe, upstream, float(previous[b'alive']), False)
+    pipe.delete(_session_key(upstream, name))
+    pipe.hset(_session_key(upstream, name), mapping={'issued': now, 'alive': 0})
+    pipe.expire(_session_key(upstream, name), config.lifetime_max_ttl * 2)
+    pipe.execute()
+
+
+def record_alive(upstream: str, name: str):
+    """
+    记录会话在本次校验时仍然有效
+
+    :param upstream: 上游系统
+    :param name: 学号
+    """
+    issued = redis_session.hget(_session_key(upstream, name), 'issued')
+    if issued:
+        redis_session.hset(_session_key(upstream, name), 'alive', time.time() - float(issued))
+
+
+def record_dead(upstream: str, name: str):
+    """
+    记录会话在本次校验时已经失效，以签发至今的时长作为寿命样本
+
+    :param upstream: 上游系统
+    :param name: 学号
+    """
+    issued = redis_session.hget(_session_key(upstream, name), 'issued')
+    if not issued:
+        return
+    pipe = redis_session.pipeline()
+    _push_sample(pipe, upstream, time.time() - float(issued), True)
+    pipe.delete(_session_key(upstream, name))
+    pipe.execute()
+
+
+def _push_sample(pipe, upstream: str, age: float, dead: bool):
+    pipe.lpush(_samples_key(upstream), '{:.0f},{}'.format(age, int(dead)))
+    pipe.ltrim(_samples_key(upstream), 0, config.lifetime_max_samples - 1)
+
+
+def _survival_quantile(samples: List[Tuple[float, bool]], probability: float) -> Optional[float]:
+    """
+    使用 Kaplan-Meier 方法估计会话寿命分布，返回失效概率达到 probability 时的寿命
+
+    仍然有效的会话作为截尾样本参与计算，观测不到时返回None
+
+    :param samples: (寿命, 是否观察到失效) 列表
+    :param probability: 累计失效概率
+    :return: 对应的寿命（秒）
+    """
+    survival = 1.0
+    at_risk = len(samples)
+    index = 0
+    samples = sorted(samples)
+    while index < len(samples):
+        age = samples[index][0]
+        deaths = total = 0
+        while index < len(samples) and samples[index][0] == age:
+            deaths += samples[index][1]
+            total += 1
+            index += 1
+        if deaths:
+            survival *= 1 - deaths / at_risk
+            if 1 - survival >= probability:
+                return age
+        at_risk -= total
+    return None
+
+
+def estimate(upstream: str) -> dict:
+    """
+    估计上游会话的寿命分布及据此得出的缓存时间和信任窗口，结果在进程内缓存一段时间
+
+    样本不足时使用配置中的默认值
+
+    :param upstream: 上游系统
+    :return: 估计结果
+    """
+    cached = _estimates.get(upstream)
+    if cached and time.time() - cached[0] < config.lifetime_estimate_interval:
+        return cached[1]
+
+    samples = []
+    for item in redis_session.lrange(_samples_key(upstream), 0, -1):
+        age, dead = item.split(b',')
+        samples.append((float(age), dead == b'1'))
+    deaths = sum(dead for _, dead in samples)
+    result = {
+        'samples': len(samples),
+        'deaths': deaths,
+        'p10': None,
+        'p50': None,
+        'p90': None,
+        'ttl': _default_ttl.get(upstream, config.cookie_expire),
+        'trustWindow': config.cookie_trust_window,
+    }
+    if deaths >= config.lifetime_min_samples:
+        result['p10'] = _survival_quantile(samples, 0.1)
+        result['p50'] = _survival_quantile(samples, 0.5)
+        result['p90'] = _survival_quantile(samples, 0.9)
+        ttl_age = _survival_quantile(samples, config.lifetime_ttl_percentile)
+        # 缓存时间取高分位寿命，观测不到则保持默认值（多数会话在默认缓存时间内未失效）
+        if ttl_age is not None:
+            result['ttl'] = int(min(max(ttl_age, config.lifetime_min_ttl), config.lifetime_max_ttl))
+        # 信任窗口取低分位寿命的一部分，使绝大多数会话在信任窗口内不会失效
+        trust_age = _survival_quantile(samples, config.lifetime_trust_percentile)
+        if trust_age is not None:
+            result['trustWindow'] = int(min(max(trust_age * config.lifetime_trust_ratio,
+                                                config.lifetime_min_trust_window),
+                                            config.cookie_trust_window))
+    _estimates[upstream] = (time.time(), result)
+    return result
+
+
+def cookie_ttl(upstream: str) -> int:
+    """
+    :param upstream: 上游系统
+    :return: 该上游会话Cookie在Redis中的缓存时间（秒）
+    """
+    return estimate(upstream)['ttl']
+
+
+def trust_window(upstream: str) -> int:
+    """
+    :param upstream: 上游系统
+    :return: 该上游会话的校验信任窗口（秒）
+    """
+    return estimate(upstream)['trustWindow']
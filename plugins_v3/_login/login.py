@@ -1,310 +1,555 @@
+import hmac
 import logging
-import pickle
-import re
+import time
+from functools import wraps
+from urllib.parse import urlparse
 
+import gevent
 import requests
+from flask import g, has_request_context
 from requests import Response
 from requests.cookies import RequestsCookieJar
+from utils import metrics
+from utils.credential import password_digest
 from utils.myrsa import Encrypt
-from plugins_v3._login import config
-from utils.exceptions import custom_abort
+from plugins_v3._login import config, flow_pool, lifetime
+from plugins_v3._login.session_cache import SessionCache
+from plugins_v3._login.session_token import token_user, revoke_tokens
+from utils.exceptions import custom_abort, CustomHTTPException
 from utils.redis_connections import redis_session, redis_experiment
-from utils.session import session
+from utils.session import session, decode_response, response_contains
+from utils.hedge import hedged_request
+
+
+def request_memo(upstream: str):
+    """ 在一次请求内记住登录结果，同一请求中再次登录同一系统时直接返回，不再读取Redis或访问上游
+    
+    仅在请求上下文中生效；带有位置参数、disable_cache 或 revalidate 的调用总是真正执行，
+    其中强制校验的结果会覆盖本次请求记住的Cookie
+    
+    :param upstream: 上游系统，如 zhjw
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(name: str, passwd: str, *args, **kwargs) -> RequestsCookieJar:
+            if not has_request_context() or args:
+                return f(name, passwd, *args, **kwargs)
+            memo = g.setdefault('login_memo', {})
+            key = (upstream, name, passwd, kwargs.get('all_cookies', True))
+            if not kwargs.get('disable_cache') and not kwargs.get('revalidate') and key in memo:
+                return memo[key]
+            cookies = f(name, passwd, **kwargs)
+            memo[key] = cookies
+            return cookies
+
+        return decorated_function
+
+    return decorator
 
 
 # 主体账号登录函数
-def login(name: str, passwd: str, disable_cache=False, all_cookies=True) -> RequestsCookieJar:
+@request_memo('zhjw')
+def login(name: str, passwd: str, disable_cache=False, all_cookies=True, revalidate=False) -> RequestsCookieJar:
     """
     统一身份认证系统登录函数
     
     工作流程：
     1. 检查参数有效性
-    2. 尝试从缓存获取有效的Cookie
-    3. 如果缓存无效，则执行完整的登录流程
-    4. 缓存新的Cookie用于后续请求
+    2. 尝试从缓存获取Cookie，若在信任窗口内校验过则直接使用
+    3. 超出信任窗口则重新校验缓存的Cookie
+    4. 如果缓存无效，则执行完整的登录流程
+    5. 缓存新的Cookie及校验时间用于后续请求
     
     :param name: 学号
     :param passwd: 密码
     :param disable_cache: 是否禁用缓存，默认False
     :param all_cookies: 是否获取所有系统的Cookie，默认True
+    :param revalidate: 是否忽略信任窗口强制校验缓存的Cookie，默认False
     :return: 包含登录凭证的Cookie对象
     """
+    # 通过令牌认证的请求没有密码，只能使用缓存的会话
+    if passwd is None and name and name == token_user():
+        return token_login(name, revalidate)
     if not name or not passwd:
         custom_abort(-3, '账号密码不能为空!')
     if name.strip() != name:
         custom_abort(-3, '用户名包含空字符!')
     # 如果存在缓存且未禁用缓存
     if not disable_cache:
-        # 尝试从Redis获取缓存的Cookie
-        cookie_pickle = redis_session.get("cookie" + name)
-        if cookie_pickle:
-            # 反序列化Cookie对象
-            cookies: RequestsCookieJar = pickle.loads(cookie_pickle)
-            # 测试Cookie是否有效
-            r = session.get(config.login_test_url, allow_redirects=False, cookies=cookies)
-            # 尝试使用不同的编码方式解码内容
-            content = None
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-                try:
-                    content = r.content.decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            # 如果保存的cookie可以正常使用的话
-            if r.status_code == 200 and content and content.find("自定义门户") != -1:
-                # 更新Cookie
-                cookies.update(r.cookies)
-                if all_cookies:
-                    # 清除可能存在的无效域名Cookie
-                    if ".222.31.49.139" in cookies.keys():
-                        cookies.clear(".222.31.49.139")
-                    # 获取教务系统Cookie
-                    res, cookies = follow_link(cookies, config.jwxt_url)
-                    # 尝试使用不同的编码方式解码内容
-                    content = None
-                    for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-                        try:
-                            content = res.content.decode(encoding)
-                            break
-                        except UnicodeDecodeError:
-                            continue
-                    
-                    # 如果保存的cookie可以正常进入教务系统
-                    if res.status_code == 200 and content and content.find("教学管理信息服务平台") != -1:
-                        # 更新缓存并设置过期时间（6小时）
-                        redis_session.set("cookie" + name, pickle.dumps(cookies), ex=21600)
-                        # 命中缓存，返回有效Cookie
-                        return cookies
-                    else:
-                        # Cookie无效，删除缓存
-                        redis_session.delete("cookie" + name)
-                        logging.info("cookies" + name + "过期删除, code为:" + str(res.status_code))
-    # 未命中缓存或缓存无效，执行完整登录流程
-    login_response, cookies = re_login(re_url=config.index_url, e_url=config.e_login_url, name=name, passwd=passwd)
-    # 检查登录结果
-    cookies = check_login(cookies=cookies, login_response=login_response)
+        cookies = zhjw_sessions.lookup(name, revalidate, all_cookies=all_cookies)
+        if cookies is not None:
+            return cookies
+    # 已知会失败的凭证直接返回失败原因，不再请求统一认证系统
+    check_login_failure(name, passwd)
+    # 未命中缓存或缓存无效，执行完整登录流程，同一账号的并发登录只执行一次；
+    # 禁用缓存的登录（如 /v3/login 验证密码）必须自己完成登录，不使用其他进程的结果
+    return zhjw_sessions.login("login" + flight_id(name, passwd) + str(int(all_cookies)),
+                               lambda: full_login(name, passwd, all_cookies), share=not disable_cache)
+
+
+def full_login(name: str, passwd: str, all_cookies=True) -> RequestsCookieJar:
+    """
+    执行完整的统一身份认证登录流程并缓存Cookie
+    
+    :param name: 学号
+    :param passwd: 密码
+    :param all_cookies: 是否获取所有系统的Cookie，默认True
+    :return: 包含登录凭证的Cookie对象
+    """
+    try:
+        login_response, cookies = re_login(re_url=config.index_url, e_url=config.e_login_url, name=name, passwd=passwd)
+        # 检查登录结果
+        cookies = check_login(cookies=cookies, login_response=login_response)
+    except CustomHTTPException as e:
+        # 记录确定会失败的登录结果，短时间内相同凭证的重试直接返回
+        if e.message in config.login_failure_messages:
+            cache_login_failure(name, passwd, e.message)
+        raise
     if all_cookies:
         # 获取教务系统cookie
         _, cookies = follow_link(cookies, config.jwxt_url)
-    # 缓存Cookie，设置过期时间（6小时）
-    redis_session.set("cookie" + name, pickle.dumps(cookies), ex=21600)
+    # 缓存Cookie及校验时间
+    zhjw_sessions.issue(name, cookies)
+    # 记录本次验证通过的密码摘要
+    remember_credential(name, passwd)
     return cookies
 
 
+def remember_credential(name: str, passwd: str):
+    """
+    记录最近一次通过统一认证验证的密码摘要及验证时间，有效期与缓存的会话一致
+    
+    :param name: 学号
+    :param passwd: 密码
+    """
+    pipe = redis_session.pipeline()
+    pipe.hset("credential" + name, mapping={'digest': password_digest(name, passwd), 'verified': time.time()})
+    pipe.expire("credential" + name, lifetime.cookie_ttl('zhjw'))
+    pipe.execute()
+
+
+def verify_credential(name: str, passwd: str) -> bool:
+    """
+    密码与最近一次验证通过的密码一致且缓存的会话仍然存在时，无需重新登录即可确认凭证有效
+    
+    距上次验证超过 credential_revalidate_interval 时在后台重新登录一次，
+    以便发现在统一认证系统中修改了密码的情况
+    
+    :param name: 学号
+    :param passwd: 密码
+    :return: 凭证是否可以直接确认有效
+    """
+    pipe = redis_session.pipeline()
+    pipe.hgetall("credential" + name)
+    pipe.exists("cookie" + name)
+    credential, session_exists = pipe.execute()
+    if not credential or not session_exists or \
+            not hmac.compare_digest(credential[b'digest'].decode(), password_digest(name, passwd)):
+        metrics.incr('credential_cache.miss')
+        return False
+    metrics.incr('credential_cache.hit')
+    if time.time() - float(credential[b'verified']) >= config.credential_revalidate_interval:
+        gevent.spawn(revalidate_credential, name, passwd)
+    return True
+
+
+def revalidate_credential(name: str, passwd: str):
+    """
+    后台使用密码重新登录，密码已失效时由 cache_login_failure 清除缓存的会话及令牌
+    
+    :param name: 学号
+    :param passwd: 密码
+    """
+    try:
+        login(name, passwd, disable_cache=True)
+    except CustomHTTPException as e:
+        logging.info("{}的凭证后台验证失败: {}".format(name, e.message))
+    except Exception as e:
+        logging.warning("{}的凭证后台验证出错: {}".format(name, e))
+
+
+def token_login(name: str, revalidate=False) -> RequestsCookieJar:
+    """
+    令牌请求使用的登录函数，直接返回缓存的统一认证及教务系统Cookie，不做校验
+    
+    缓存不存在或强制校验时发现已失效，则要求客户端重新使用账号密码登录
+    
+    :param name: 学号
+    :param revalidate: 是否强制校验缓存的Cookie，默认False
+    :return: 包含登录凭证的Cookie对象
+    """
+    cookies, _ = zhjw_sessions.get(name)
+    if cookies is not None:
+        if not revalidate:
+            return cookies
+        cookies = zhjw_sessions.revalidate(name, cookies)
+        if cookies is not None:
+            return cookies
+    custom_abort(-3, '登录已过期，请重新登录!')
+
+
+def flight_id(name: str, passwd: str) -> str:
+    """
+    生成合并并发登录使用的标识，密码不同的登录不会被合并
+    
+    :param name: 学号
+    :param passwd: 密码，令牌请求为None
+    :return: 登录标识
+    """
+    if passwd is None:
+        return name + ":token"
+    return name + ":" + password_digest(name, passwd)[:16]
+
+
+def check_login_failure(name: str, passwd: str):
+    """
+    检查该组凭证最近是否登录失败过，命中时直接返回同样的失败原因
+    
+    缓存键包含密码的加盐摘要，更换密码后不会命中
+    
+    :param name: 学号
+    :param passwd: 密码
+    """
+    message = redis_session.get("login_failed:" + name + ":" + password_digest(name, passwd))
+    if message:
+        metrics.incr('login_failure_cache.hit')
+        custom_abort(-3, message.decode())
+    metrics.incr('login_failure_cache.miss')
+
+
+def cache_login_failure(name: str, passwd: str, message: str):
+    """
+    缓存确定会失败的登录结果
+    
+    若失败的正是最近一次验证通过的密码，说明密码已在统一认证系统中失效，
+    同时清除缓存的会话并撤销该学生的全部令牌；其他密码的失败不影响已有会话
+    
+    :param name: 学号
+    :param passwd: 密码
+    :param message: 失败原因
+    """
+    digest = password_digest(name, passwd)
+    redis_session.set("login_failed:" + name + ":" + digest, message, ex=config.login_failure_ttl)
+    metrics.incr('login_failure_cache.store')
+    remembered = redis_session.hget("credential" + name, 'digest')
+    if remembered and hmac.compare_digest(remembered.decode(), digest):
+        redis_session.delete("credential" + name, "cookie" + name, "validated" + name)
+        revoke_tokens(name)
+
+
+def validate_cookies(cookies: RequestsCookieJar, all_cookies=True):
+    """
+    校验缓存的统一认证Cookie是否有效，并重新获取教务系统Cookie
+    
+    :param cookies: 缓存的Cookie对象
+    :param all_cookies: 是否获取所有系统的Cookie，默认True
+    :return: 更新后的Cookie对象，Cookie已失效时返回None
+    """
+    r = session.get(config.login_test_url, allow_redirects=False, cookies=cookies)
+    # 如果保存的cookie无法正常使用
+    if r.status_code != 200 or not response_contains(r, "自定义门户"):
+        return None
+    # 更新Cookie
+    cookies.update(r.cookies)
+    if not all_cookies:
+        return cookies
+    # 清除可能存在的无效域名Cookie
+    if ".222.31.49.139" in cookies.keys():
+        cookies.clear(".222.31.49.139")
+    # 获取教务系统Cookie
+    res, cookies = follow_link(cookies, config.jwxt_url)
+    # 如果保存的cookie可以正常进入教务系统
+    if res.status_code == 200 and response_contains(res, "教学管理信息服务平台"):
+        return cookies
+    logging.info("教务系统Cookie校验失败, code为:" + str(res.status_code))
+    return None
+
+
+# 统一认证及教务系统的会话缓存
+zhjw_sessions = SessionCache('zhjw', redis_session, "cookie", "validated", validate_cookies)
+
+
+def login_expired(response: Response, expect_json=True) -> bool:
+    """
+    判断业务请求的响应是否说明登录状态已失效
+    
+    请求需以 allow_redirects=False 发出，被重定向（通常跳转到登录页）即视为失效；
+    期望返回JSON的接口若返回了HTML页面，同样视为失效。
+    
+    :param response: 业务请求的响应对象
+    :param expect_json: 该接口是否应返回JSON
+    :return: 登录状态是否失效
+    """
+    if response.is_redirect:
+        return True
+    return expect_json and response.content.lstrip()[:1] == b'<'
+
+
+def jwxt_request(method: str, url: str, name: str, passwd: str, expect_json=True, hedge=False,
+                 **kwargs) -> Response:
+    """
+    携带缓存的教务系统Cookie发起业务请求
+    
+    若响应为登录重定向或本应是JSON却返回了HTML，则强制重新校验登录状态并重试一次
+    
+    :param method: HTTP请求方法
+    :param url: 业务接口URL
+    :param name: 学号
+    :param passwd: 密码
+    :param expect_json: 该接口是否应返回JSON，默认True
+    :param hedge: 是否对请求进行对冲，只能用于幂等的查询接口，默认False
+    :param kwargs: 其他传递给session.request的参数
+    :return: 业务请求的响应对象
+    """
+    send = hedged_request if hedge else session.request
+    cookies = login(name, passwd)
+    response = send(method, url, cookies=cookies, allow_redirects=False, **kwargs)
+    if login_expired(response, expect_json):
+        logging.info("{}的教务系统Cookie已失效，重新校验后重试".format(name))
+        cookies = login(name, passwd, revalidate=True)
+        response = send(method, url, cookies=cookies, allow_redirects=False, **kwargs)
+    return response
+
+
 # 实验系统登录
-def experiment_login(name: str, passwd: str) -> RequestsCookieJar:
+@request_memo('sygl')
+def experiment_login(name: str, passwd: str, revalidate=False) -> RequestsCookieJar:
     """
     实验系统登录函数
     
     工作流程：
-    1. 尝试从缓存获取有效的Cookie
-    2. 如果缓存无效，则使用统一认证系统的Cookie获取实验系统的Cookie
+    1. 尝试从缓存获取Cookie，若在信任窗口内校验过则直接使用
+    2. 超出信任窗口则重新校验缓存的Cookie
+    3. 如果缓存无效，则使用统一认证系统的Cookie获取实验系统的Cookie
     
     :param name: 学号
     :param passwd: 密码
+    :param revalidate: 是否忽略信任窗口强制校验缓存的Cookie，默认False
     :return: 包含登录凭证的Cookie对象
     """
-    from plugins_v3.experiment import config as exp_config
-    
-    # 尝试从缓存获取Cookie
-    cookie_pickle = redis_experiment.get("experiment" + name)
-    # 如果命中缓存
-    if cookie_pickle:
-        cookies: RequestsCookieJar = pickle.loads(cookie_pickle)
-        try:
-            r = session.get(exp_config.index_url + "1", allow_redirects=False, cookies=cookies)
-            # 尝试使用不同的编码方式解码内容
-            content = None
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-                try:
-                    content = r.content.decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-                    
-            # 如果缓存可以正常使用
-            if r.status_code == 200 and content and ("中北大学实践教学管理平台" in content or "实验教学管理平台" in content):
-                cookies.update(r.cookies)
-                redis_experiment.set("experiment" + name, pickle.dumps(cookies), ex=21600)
-                return cookies
-            else:
-                redis_experiment.delete("experiment" + name)
-        except Exception as e:
-            redis_experiment.delete("experiment" + name)
-            logging.error(f"验证缓存Cookie时出错: {e}")
+    cookies = sygl_sessions.lookup(name, revalidate)
+    if cookies is not None:
+        return cookies
 
-    # 未命中缓存，使用统一认证系统的Cookie获取实验系统的Cookie
+    # 未命中缓存，使用统一认证系统的Cookie获取实验系统的Cookie，同一账号的并发登录只执行一次
     try:
-        # 1. 获取统一认证系统的Cookie
-        auth_cookies = login(name, passwd)
-        
-        # 2. 调用获取实验室系统Cookie的函数
-        merged_cookies = get_lab_cookie(auth_cookies)
-        
-        if not merged_cookies:
-            custom_abort(-1, "实验系统登录失败：无法获取有效的Cookie")
-        
-        # 3. 缓存Cookie
-        redis_experiment.set("experiment" + name, pickle.dumps(merged_cookies), ex=21600)
-        
-        return merged_cookies
+        return sygl_sessions.login("experiment" + flight_id(name, passwd),
+                                   lambda: full_experiment_login(name, passwd))
     except Exception as e:
         logging.error(f"实验系统登录过程中出错: {e}", exc_info=True)
         raise e
 
 
+def full_experiment_login(name: str, passwd: str) -> RequestsCookieJar:
+    """
+    使用统一认证系统的Cookie获取实验系统的Cookie并缓存
+    
+    :param name: 学号
+    :param passwd: 密码
+    :return: 包含登录凭证的Cookie对象
+    """
+    # 1. 获取统一认证系统的Cookie
+    auth_cookies = login(name, passwd)
+    
+    # 2. 调用获取实验室系统Cookie的函数
+    merged_cookies = get_lab_cookie(auth_cookies)
+    
+    if not merged_cookies:
+        custom_abort(-1, "实验系统登录失败：无法获取有效的Cookie")
+    
+    # 3. 缓存Cookie
+    sygl_sessions.issue(name, merged_cookies)
+    
+    return merged_cookies
+
+
+def validate_experiment_cookies(cookies: RequestsCookieJar):
+    """
+    校验缓存的实验系统Cookie是否有效
+    
+    :param cookies: 缓存的Cookie对象
+    :return: 更新后的Cookie对象，Cookie已失效时返回None
+    """
+    from plugins_v3.experiment import config as exp_config
+    
+    r = session.get(exp_config.index_url + "1", allow_redirects=False, cookies=cookies)
+    if r.status_code == 200 and response_contains(r, "中北大学实践教学管理平台", "实验教学管理平台"):
+        cookies.update(r.cookies)
+        return cookies
+    return None
+
+
+# 实验系统的会话缓存，校验出错时删除缓存的Cookie并重新登录
+sygl_sessions = SessionCache('sygl', redis_experiment, "experiment", "validated", validate_experiment_cookies,
+                             drop_on_error=True)
+
+
+def lab_request(url: str, name: str, passwd: str, **kwargs) -> Response:
+    """
+    携带缓存的实验系统Cookie发起GET请求
+    
+    若响应为登录重定向，则强制重新校验实验系统登录状态并重试一次
+    
+    :param url: 实验系统页面URL
+    :param name: 学号
+    :param passwd: 密码
+    :param kwargs: 其他传递给session.get的参数
+    :return: 业务请求的响应对象
+    """
+    cookies = experiment_login(name, passwd)
+    response = session.get(url, cookies=cookies, allow_redirects=False, **kwargs)
+    if login_expired(response, expect_json=False):
+        logging.info("{}的实验系统Cookie已失效，重新校验后重试".format(name))
+        cookies = experiment_login(name, passwd, revalidate=True)
+        response = session.get(url, cookies=cookies, allow_redirects=False, **kwargs)
+    return response
+
+
+# 实验系统单点登录各步骤使用的通用请求头
+_lab_headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1"
+}
+
+# 快速路径失败后暂停使用的截止时间
+_lab_fast_disabled_until = 0.0
+
+
+def _lab_get(url: str, host: str, cookies=None, allow_redirects=False, referer=None) -> Response:
+    headers = _lab_headers.copy()
+    headers["Host"] = host
+    if referer:
+        headers["Referer"] = referer
+    return session.get(url, headers=headers, cookies=cookies, allow_redirects=allow_redirects)
+
+
+def _lab_redirect(response: Response, state: dict) -> bool:
+    if response.status_code != 302 or "Location" not in response.headers:
+        return False
+    state["url"] = response.headers["Location"]
+    return True
+
+
+def _lab_hop_service(state: dict, exp_config) -> bool:
+    # 访问实验系统入口URL，获取重定向到CAS的URL
+    return _lab_redirect(_lab_get(exp_config.lab_service_url, exp_config.lab_host), state)
+
+
+def _lab_hop_cas(state: dict, exp_config) -> bool:
+    # 携带统一认证Cookie访问CAS URL，获取带ticket的重定向URL
+    response = _lab_get(state["url"], "zhrz.nuc.edu.cn", cookies=state["auth_cookies"])
+    return _lab_redirect(response, state)
+
+
+def _lab_hop_ticket(state: dict, exp_config) -> bool:
+    # 访问带ticket的URL，获取JSESSIONID及带jsessionid的重定向URL
+    response = _lab_get(state["url"], exp_config.lab_host)
+    state["cookies"] = response.cookies
+    return "JSESSIONID" in state["cookies"].keys() and _lab_redirect(response, state)
+
+
+def _lab_hop_session(state: dict, exp_config) -> bool:
+    # 访问带jsessionid的URL，获取aexpsid及重定向到学生首页的URL
+    response = _lab_get(state["url"], exp_config.lab_host, cookies=state["cookies"])
+    state["cookies"].update(response.cookies)
+    return _lab_redirect(response, state)
+
+
+def _lab_hop_student_index(state: dict, exp_config) -> bool:
+    # 访问学生首页，完成登录流程
+    response = _lab_get(state["url"], exp_config.lab_host, cookies=state["cookies"])
+    state["cookies"].update(response.cookies)
+    return True
+
+
+def _lab_hop_left_menu(state: dict, exp_config) -> bool:
+    # 访问左侧菜单页面，作为访问实验教学管理平台首页的Referer
+    _lab_get(exp_config.lab_left_menu_url, exp_config.lab_host, cookies=state["cookies"], allow_redirects=True)
+    return True
+
+
+def _lab_hop_teachn(state: dict, exp_config) -> bool:
+    # 访问实验教学管理平台首页
+    response = _lab_get(exp_config.lab_teachn_url, exp_config.lab_host, cookies=state["cookies"],
+                        allow_redirects=True, referer=exp_config.lab_left_menu_url)
+    state["cookies"].update(response.cookies)
+    return True
+
+
+# 单点登录步骤名称 -> 实现函数，返回False表示该步骤失败
+_lab_hops = {
+    "service": _lab_hop_service,
+    "cas": _lab_hop_cas,
+    "ticket": _lab_hop_ticket,
+    "session": _lab_hop_session,
+    "student_index": _lab_hop_student_index,
+    "left_menu": _lab_hop_left_menu,
+    "teachn": _lab_hop_teachn,
+}
+
+
+def run_lab_hops(auth_cookies: RequestsCookieJar, hops) -> RequestsCookieJar:
+    """
+    按顺序执行实验系统单点登录的各个步骤，并记录每一步的耗时
+    
+    :param auth_cookies: 统一认证系统的Cookie
+    :param hops: 步骤名称列表，可用的步骤见 _lab_hops
+    :return: 只包含JSESSIONID和aexpsid的Cookie对象，任一步骤失败时返回None
+    """
+    from plugins_v3.experiment import config as exp_config
+    
+    state = {"auth_cookies": auth_cookies}
+    for hop in hops:
+        start = time.time()
+        ok = _lab_hops[hop](state, exp_config)
+        elapsed = (time.time() - start) * 1000
+        metrics.observe("lab_sso.hop." + hop + ".ms", elapsed)
+        logging.debug("实验系统单点登录步骤 %s 耗时 %.0fms", hop, elapsed)
+        if not ok:
+            logging.info("实验系统单点登录在步骤 %s 失败", hop)
+            return None
+    
+    # 只保留必要的Cookie
+    final_cookies = RequestsCookieJar()
+    for cookie in state.get("cookies", ()):
+        if cookie.name in ["JSESSIONID", "aexpsid"]:
+            final_cookies.set(cookie.name, cookie.value, domain=cookie.domain or exp_config.lab_host,
+                              path=cookie.path or "/")
+    return final_cookies
+
+
 def get_lab_cookie(auth_cookies: RequestsCookieJar) -> RequestsCookieJar:
     """
     使用统一认证系统的Cookie获取实验室系统的Cookie
     
     工作流程：
-    1. 访问实验系统入口URL，获取重定向到CAS的URL
-    2. 携带统一认证Cookie访问CAS URL，获取带ticket的重定向URL
-    3. 访问带ticket的URL，获取JSESSIONID并获取下一个重定向URL
-    4. 访问带jsessionid的URL，获取aexpsid并获取重定向到学生首页的URL
-    5. 访问学生首页，完成登录流程
-    6. 访问实验教学管理平台首页，验证Cookie有效性
+    1. 先执行配置的最少步骤（lab_fast_hops），并校验得到的Cookie是否可以访问实验教学管理平台
+    2. 快速路径失败时执行完整步骤（lab_full_hops）：实验系统入口、CAS、ticket、jsessionid、
+       学生首页、左侧菜单、实验教学管理平台首页，并在一段时间内不再尝试快速路径
     
     :param auth_cookies: 统一认证系统的Cookie
     :return: 合并后的Cookie对象，如果获取失败则返回None
     """
+    global _lab_fast_disabled_until
     from plugins_v3.experiment import config as exp_config
     
     try:
-        # 设置通用请求头
-        common_headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "zh-CN,zh;q=0.9",
-            "Connection": "keep-alive",
-            "Upgrade-Insecure-Requests": "1"
-        }
-        
-        # 步骤1: 访问实验系统入口URL，获取重定向到CAS的URL
-        step1_url = exp_config.lab_service_url
-        step1_headers = common_headers.copy()
-        step1_headers["Host"] = exp_config.lab_host
-        
-        step1_response = session.get(step1_url, headers=step1_headers, allow_redirects=False)
-        
-        if step1_response.status_code != 302 or "Location" not in step1_response.headers:
-            return None
-            
-        # 获取重定向到CAS的URL
-        cas_url = step1_response.headers["Location"]
-        
-        # 步骤2: 携带统一认证Cookie访问CAS URL，获取带ticket的重定向URL
-        step2_headers = common_headers.copy()
-        step2_headers["Host"] = "zhrz.nuc.edu.cn"
-        
-        step2_response = session.get(cas_url, headers=step2_headers, cookies=auth_cookies, allow_redirects=False)
-        
-        if step2_response.status_code != 302 or "Location" not in step2_response.headers:
-            return None
-            
-        # 获取带ticket的重定向URL
-        ticket_url = step2_response.headers["Location"]
-        
-        # 步骤3: 访问带ticket的URL，获取JSESSIONID并获取下一个重定向URL
-        step3_headers = common_headers.copy()
-        step3_headers["Host"] = exp_config.lab_host
-        
-        step3_response = session.get(ticket_url, headers=step3_headers, allow_redirects=False)
-        
-        if step3_response.status_code != 302 or "Location" not in step3_response.headers:
-            return None
-            
-        # 获取JSESSIONID
-        lab_cookies = step3_response.cookies
-        jsessionid = None
-        for cookie in lab_cookies:
-            if cookie.name == "JSESSIONID":
-                jsessionid = cookie.value
-                break
-                
-        if not jsessionid:
-            return None
-            
-        # 获取下一个重定向URL（带jsessionid的URL）
-        jsessionid_url = step3_response.headers["Location"]
-        
-        # 步骤4: 访问带jsessionid的URL，获取aexpsid并获取重定向到学生首页的URL
-        step4_headers = common_headers.copy()
-        step4_headers["Host"] = exp_config.lab_host
-        
-        step4_response = session.get(jsessionid_url, headers=step4_headers, cookies=lab_cookies, allow_redirects=False)
-        
-        if step4_response.status_code != 302 or "Location" not in step4_response.headers:
-            return None
-            
-        # 更新Cookie，获取aexpsid
-        lab_cookies.update(step4_response.cookies)
-        aexpsid = None
-        for cookie in lab_cookies:
-            if cookie.name == "aexpsid":
-                aexpsid = cookie.value
-                break
-        
-        # 获取学生首页URL
-        student_index_url = step4_response.headers["Location"]
-        
-        # 步骤5: 访问学生首页，完成登录流程
-        step5_headers = common_headers.copy()
-        step5_headers["Host"] = exp_config.lab_host
-        
-        step5_response = session.get(student_index_url, headers=step5_headers, cookies=lab_cookies, allow_redirects=False)
-        
-        # 更新Cookie
-        lab_cookies.update(step5_response.cookies)
-        
-        # 再次检查是否获取到aexpsid（如果之前没有获取到）
-        if not aexpsid:
-            for cookie in lab_cookies:
-                if cookie.name == "aexpsid":
-                    aexpsid = cookie.value
-                    break
-        
-        # 步骤6: 访问实验教学管理平台首页，验证Cookie有效性
-        # 先访问左侧菜单页面，获取正确的Referer
-        left_menu_url = f"http://{exp_config.lab_host}/aexp/stuLeft.jsp"
-        
-        left_menu_headers = common_headers.copy()
-        left_menu_headers["Host"] = exp_config.lab_host
-        
-        left_menu_response = session.get(left_menu_url, headers=left_menu_headers, cookies=lab_cookies)
-        
-        # 访问实验教学管理平台首页
-        teachn_url = f"http://{exp_config.lab_host}/teachn/teachnAction/index.action"
-        
-        teachn_headers = common_headers.copy()
-        teachn_headers["Host"] = exp_config.lab_host
-        teachn_headers["Referer"] = left_menu_url  # 设置正确的Referer
-        
-        teachn_response = session.get(teachn_url, headers=teachn_headers, cookies=lab_cookies)
-        
-        # 更新Cookie
-        lab_cookies.update(teachn_response.cookies)
-        
-        # 构建最终的Cookie对象
-        final_cookies = RequestsCookieJar()
-        
-        # 只保留必要的Cookie
-        for cookie in lab_cookies:
-            if cookie.name in ["JSESSIONID", "aexpsid"]:
-                final_cookies.set(cookie.name, cookie.value, domain=cookie.domain or exp_config.lab_host, path=cookie.path or "/")
-        
-        # 检查是否同时获取到了JSESSIONID和aexpsid
-        has_jsessionid = "JSESSIONID" in [cookie.name for cookie in final_cookies]
-        has_aexpsid = "aexpsid" in [cookie.name for cookie in final_cookies]
-        
-        # 尝试补全缺失的Cookie
-        if not has_jsessionid and jsessionid:
-            final_cookies.set("JSESSIONID", jsessionid, domain=exp_config.lab_host, path="/")
-        if not has_aexpsid and aexpsid:
-            final_cookies.set("aexpsid", aexpsid, domain=exp_config.lab_host, path="/")
+        if exp_config.lab_fast_hops and time.time() >= _lab_fast_disabled_until:
+            cookies = run_lab_hops(auth_cookies, exp_config.lab_fast_hops)
+            if cookies is not None and validate_experiment_cookies(cookies) is not None:
+                metrics.incr("lab_sso.fast.success")
+                return cookies
+            metrics.incr("lab_sso.fast.fallback")
+            _lab_fast_disabled_until = time.time() + exp_config.lab_fast_cooldown
+            logging.warning("实验系统单点登录快速路径失败，改用完整流程")
         
-        return final_cookies
+        cookies = run_lab_hops(auth_cookies, exp_config.lab_full_hops)
+        metrics.incr("lab_sso.full.success" if cookies is not None else "lab_sso.full.failure")
+        return cookies
         
     except Exception as e:
         logging.error(f"获取实验室系统Cookie时出错: {e}", exc_info=True)
@@ -312,51 +557,156 @@ def get_lab_cookie(auth_cookies: RequestsCookieJar) -> RequestsCookieJar:
 
 
 # 体育管理系统登录
-def physical_login(name: str, passwd: str) -> RequestsCookieJar:
-    login_response, cookies = re_login(re_url=config.physical_url, e_url=config.e_physical_url, name=name, passwd=passwd)
-    # 正式迭代登录并判断登录结果
-    cookies = check_login(cookies=cookies, login_response=login_response)
+@request_memo('tygl')
+def physical_login(name: str, passwd: str, revalidate=False) -> RequestsCookieJar:
+    """
+    体育系统登录函数
+    
+    工作流程：
+    1. 尝试从缓存获取Cookie，若在信任窗口内校验过则直接使用
+    2. 超出信任窗口则重新校验缓存的Cookie
+    3. 如果缓存无效，则使用统一认证系统的会话换取体育系统的service ticket，失败时再用密码登录
+    
+    :param name: 学号
+    :param passwd: 密码
+    :param revalidate: 是否忽略信任窗口强制校验缓存的Cookie，默认False
+    :return: 包含登录凭证的Cookie对象
+    """
+    cookies = tygl_sessions.lookup(name, revalidate)
+    if cookies is not None:
+        return cookies
+
+    # 未命中缓存，重新获取体育系统的Cookie，同一账号的并发登录只执行一次
+    return tygl_sessions.login("physical" + flight_id(name, passwd), lambda: full_physical_login(name, passwd))
+
+
+def full_physical_login(name: str, passwd: str) -> RequestsCookieJar:
+    """
+    获取体育系统的Cookie并缓存
+    
+    优先携带统一认证系统的Cookie访问体育系统的CAS入口，由CAS直接签发service ticket，
+    统一认证会话失效时再使用密码登录体育系统
+    
+    :param name: 学号
+    :param passwd: 密码
+    :return: 包含登录凭证的Cookie对象
+    """
+    cookies = get_physical_cookie(login(name, passwd))
+    if cookies is None:
+        logging.info("{}的统一认证会话无法换取体育系统Cookie，使用密码登录".format(name))
+        if passwd is None:
+            custom_abort(-3, '登录已过期，请重新登录!')
+        check_login_failure(name, passwd)
+        login_response, cookies = re_login(re_url=config.physical_url, e_url=config.e_physical_url,
+                                           name=name, passwd=passwd)
+        # 正式迭代登录并判断登录结果
+        cookies = check_login(cookies=cookies, login_response=login_response)
+        cookies = enter_physical(cookies)
+    tygl_sessions.issue(name, cookies)
+    return cookies
+
+
+def get_physical_cookie(auth_cookies: RequestsCookieJar):
+    """
+    使用统一认证系统的Cookie换取体育系统的Cookie
+    
+    :param auth_cookies: 统一认证系统的Cookie
+    :return: 合并后的Cookie对象，统一认证会话已失效时返回None
+    """
+    response, cookies = follow_link(auth_cookies.copy(), config.physical_url)
+    # 统一认证会话有效时会重定向到体育系统，否则停留在CAS登录页
+    if urlparse(response.url).hostname == urlparse(config.physical_url).hostname:
+        return None
+    return enter_physical(cookies)
+
+
+def enter_physical(cookies: RequestsCookieJar) -> RequestsCookieJar:
+    """
+    访问体育系统的单点登录入口，完成体育系统会话的初始化
+    
+    :param cookies: 包含体育系统登录凭证的Cookie对象
+    :return: 更新后的Cookie对象
+    """
+    from plugins_v3.physical import config as physical_config
+    
+    response = session.get(physical_config.pre_url, cookies=cookies)
+    cookies.update(response.cookies)
     return cookies
 
 
+def validate_physical_cookies(cookies: RequestsCookieJar):
+    """
+    校验缓存的体育系统Cookie是否有效
+    
+    :param cookies: 缓存的Cookie对象
+    :return: 更新后的Cookie对象，Cookie已失效时返回None
+    """
+    from plugins_v3.physical import config as physical_config
+    
+    r = session.post(physical_config.sys_url, allow_redirects=False, cookies=cookies)
+    if r.status_code == 200 and not login_expired(r):
+        cookies.update(r.cookies)
+        return cookies
+    return None
+
+
+# 体育系统的会话缓存，校验出错时删除缓存的Cookie并重新登录
+tygl_sessions = SessionCache('tygl', redis_session, "physical", "physical_validated", validate_physical_cookies,
+                             drop_on_error=True)
+
+
+def physical_request(method: str, url: str, name: str, passwd: str, **kwargs) -> Response:
+    """
+    携带缓存的体育系统Cookie发起业务请求
+    
+    若响应为登录重定向或返回了HTML页面，则强制重新校验体育系统登录状态并重试一次
+    
+    :param method: HTTP请求方法
+    :param url: 业务接口URL
+    :param name: 学号
+    :param passwd: 密码
+    :param kwargs: 其他传递给session.request的参数
+    :return: 业务请求的响应对象
+    """
+    cookies = physical_login(name, passwd)
+    response = session.request(method, url, cookies=cookies, allow_redirects=False, **kwargs)
+    if login_expired(response):
+        logging.info("{}的体育系统Cookie已失效，重新校验后重试".format(name))
+        cookies = physical_login(name, passwd, revalidate=True)
+        response = session.request(method, url, cookies=cookies, allow_redirects=False, **kwargs)
+    return response
+
+
 # 登录以及重新登录
 def re_login(re_url, e_url, name, passwd):
     re_num = 0
     while True:
         try:
-            index_response = session.get(re_url)
-            if not index_response.ok:
-                logging.error(f"Failed to get login page, status code: {index_response.status_code}")
-                custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
+            # 优先使用预热好的登录流程，省去获取登录页和公钥的两次请求
+            flow = flow_pool.take(re_url) if re_num == 0 else None
+            if flow is None:
+                flow = flow_pool.open_flow(re_url)
             
-            # 尝试使用不同的编码方式解码内容
-            content = None
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-                try:
-                    content = index_response.content.decode(encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-                    
-            if not content:
-                logging.error("无法解码登录页面响应内容")
-                custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
-                
-            if content.find("Loading...") != -1:
-                custom_abort(-1, 'VPN通道已关闭!')
-                
             # 获取用于提交登录的数据和cookie
-            cookies, post_data = ready_login(index_response=index_response, name=name, passwd=passwd)
+            cookies, post_data = ready_login(flow=flow, name=name, passwd=passwd)
             
             # 提交登录
             login_response = session.post(re_url, allow_redirects=False, data=post_data, cookies=cookies)
             
-            if login_response.headers.get('Location') != e_url or re_num > 3:
+            if login_response.headers.get('Location') != e_url:
+                flow_pool.accepted(flow)
+                break
+            flow_pool.rejected(flow)
+            if re_num > 3:
                 break
                 
             re_num += 1
             logging.warning('{}登录异常,第{}次重新发送登录请求!'.format(name, re_num))
             
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            # 连接失败（包括熔断器拒绝）及超时时立即失败：幂等请求已由适配器在剩余时间内按退避重试，
+            # 立即重新打开登录流程只会继续请求无法连接的主机
+            raise
         except Exception as e:
             logging.error(f"Login attempt failed: {str(e)}")
             if re_num > 3:
@@ -380,48 +730,17 @@ def follow_link(cookies: RequestsCookieJar, url: str) -> (Response, RequestsCook
 
 
 # 请求的数据
-def ready_login(index_response: Response, name: str, passwd: str):
-    cookies = index_response.cookies
-    
-    # 尝试使用不同的编码方式解码内容
-    content = None
-    for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-        try:
-            content = index_response.content.decode(encoding)
-            break
-        except UnicodeDecodeError:
-            continue
-            
-    if not content:
-        logging.error("无法解码登录页面响应内容")
-        custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
-    
-    # Check if we got a valid response with the execution value
-    execution_match = re.search('name="execution" value="(.*?)"', content)
-    if not execution_match:
-        # Log the response content for debugging
-        logging.error(f"Failed to find execution value in response. Content: {content[:200]}...")
-        custom_abort(-1, '登录系统暂时无法访问，请稍后再试!')
-        
-    execution = execution_match.group(1)
-    
-    try:
-        public_key_dict_resp = session.get(config.public_key_url, cookies=cookies)
-        cookies.update(public_key_dict_resp.cookies)
-        public_key_dict = public_key_dict_resp.json()
-    except Exception as e:
-        logging.error(f"Failed to get public key: {str(e)}")
-        custom_abort(-1, '获取登录密钥失败，请稍后再试!')
-
+def ready_login(flow: dict, name: str, passwd: str):
+    public_key_dict = flow['public_key']
     post_data = {
         'authcode': '',
         '_eventId': 'submit',
-        'execution': execution,
+        'execution': flow['execution'],
         'username': name,
         # 获取rsa加密的密码
         'password': Encrypt(public_key_dict["exponent"], public_key_dict["modulus"]).encrypt(passwd[::-1])
     }
-    return cookies, post_data
+    return flow['cookies'], post_data
 
 
 # 判断登录结果,更新cookies并返回
@@ -432,15 +751,7 @@ def check_login(cookies: RequestsCookieJar, login_response: Response):
     if login_response.status_code == 302:
         login_response, cookies = follow_link(login_response.cookies, login_response.headers.get('location'))
     
-    # 尝试使用不同的编码方式解码内容
-    login_response_html = None
-    for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-        try:
-            login_response_html = login_response.content.decode(encoding)
-            break
-        except UnicodeDecodeError:
-            continue
-            
+    login_response_html = decode_response(login_response)
     if not login_response_html:
         custom_abort(-1, '无法解码登录响应内容')
         
@@ -0,0 +1,152 @@
+import logging
+import time
+from typing import Callable, Optional, Tuple
+
+from redis import StrictRedis
+from requests.cookies import RequestsCookieJar
+
+from plugins_v3._login import config, lifetime
+from utils import cookie_codec
+from utils.single_flight import single_flight
+
+
+class SessionCache:
+    """
+    单个上游系统缓存在Redis中的会话
+
+    Cookie、上次校验时间及账号的活跃时间记录在同一个Redis中：
+    在信任窗口内校验过的Cookie直接使用，超出信任窗口时重新校验，失效的Cookie被删除；
+    缓存无效时同一账号的并发登录只执行一次，登录结果由 issue 缓存
+    """
+
+    def __init__(self, upstream: str, redis_conn: StrictRedis, cookie_prefix: str, validated_prefix: str,
+                 validate: Callable[..., Optional[RequestsCookieJar]], drop_on_error: bool = False):
+        """
+        :param upstream: 上游系统，如 zhjw，用于信任窗口及会话寿命的统计
+        :param redis_conn: 缓存会话的Redis连接
+        :param cookie_prefix: Cookie的键前缀
+        :param validated_prefix: 上次校验时间的键前缀
+        :param validate: 校验Cookie的函数，有效时返回更新后的Cookie，失效时返回None
+        :param drop_on_error: 校验出错时是否删除缓存的Cookie并重新登录，为False时直接抛出异常
+        """
+        self.upstream = upstream
+        self.redis_conn = redis_conn
+        self.cookie_prefix = cookie_prefix
+        self.validated_prefix = validated_prefix
+        self.validate = validate
+        self.drop_on_error = drop_on_error
+
+    def get(self, name: str) -> Tuple[Optional[RequestsCookieJar], Optional[float]]:
+        """
+        读取缓存的Cookie及其上次校验时间，同时记录账号的活跃时间供后台刷新
+
+        :param name: 学号
+        :return: Cookie对象及上次校验时间，不存在时为None
+        """
+        pipe = self.redis_conn.pipeline()
+        pipe.zadd(config.active_sessions_key, {name: time.time()})
+        pipe.mget(self.cookie_prefix + name, self.validated_prefix + name)
+        cookie_data, validated_at = pipe.execute()[-1]
+        if not cookie_data:
+            return None, None
+        return cookie_codec.loads(cookie_data), float(validated_at) if validated_at else None
+
+    def lookup(self, name: str, revalidate=False, **validate_kwargs) -> Optional[RequestsCookieJar]:
+        """
+        获取可用的缓存Cookie，在信任窗口内校验过则直接使用，否则重新校验
+
+        :param name: 学号
+        :param revalidate: 是否忽略信任窗口强制校验，默认False
+        :param validate_kwargs: 其他传递给校验函数的参数
+        :return: 有效的Cookie对象，缓存不存在或已失效时返回None
+        """
+        cookies, validated_at = self.get(name)
+        if cookies is None:
+            return None
+        # 信任窗口内直接使用缓存的Cookie，业务请求失败时再重新校验
+        if not revalidate and validated_at and \
+                time.time() - validated_at < lifetime.trust_window(self.upstream):
+            return cookies
+        return self.revalidate(name, cookies, **validate_kwargs)
+
+    def revalidate(self, name: str, cookies: RequestsCookieJar, **validate_kwargs) -> Optional[RequestsCookieJar]:
+        """
+        校验Cookie，有效时更新缓存及校验时间，失效时删除缓存
+
+        :param name: 学号
+        :param cookies: 缓存的Cookie对象
+        :param validate_kwargs: 其他传递给校验函数的参数
+        :return: 更新后的Cookie对象，已失效时返回None
+        """
+        try:
+            cookies = self.validate(cookies, **validate_kwargs)
+        except Exception as e:
+            if not self.drop_on_error:
+                raise
+            self.redis_conn.delete(self.cookie_prefix + name, self.validated_prefix + name)
+            logging.error(f"验证{name}缓存的{self.upstream}Cookie时出错: {e}")
+            return None
+        if cookies is None:
+            self.redis_conn.delete(self.cookie_prefix + name, self.validated_prefix + name)
+            lifetime.record_dead(self.upstream, name)
+            logging.info("{}缓存的{}Cookie已失效，删除".format(name, self.upstream))
+            return None
+        self.save(name, cookies)
+        lifetime.record_alive(self.upstream, name)
+        return cookies
+
+    def refresh(self, name: str) -> bool:
+        """
+        后台刷新缓存的会话，无需密码
+
+        :param name: 学号
+        :return: 会话是否仍然有效
+        """
+        cookie_data = self.redis_conn.get(self.cookie_prefix + name)
+        if not cookie_data:
+            return False
+        return self.revalidate(name, cookie_codec.loads(cookie_data)) is not None
+
+    def save(self, name: str, cookies: RequestsCookieJar):
+        """
+        缓存Cookie，并记录本次校验时间
+
+        :param name: 学号
+        :param cookies: 已验证有效的Cookie对象
+        """
+        pipe = self.redis_conn.pipeline()
+        ttl = lifetime.cookie_ttl(self.upstream)
+        pipe.set(self.cookie_prefix + name, cookie_codec.dumps(cookies), ex=ttl)
+        pipe.set(self.validated_prefix + name, time.time(), ex=ttl)
+        pipe.execute()
+
+    def issue(self, name: str, cookies: RequestsCookieJar):
+        """
+        缓存新登录得到的Cookie，并记录会话的签发时间
+
+        :param name: 学号
+        :param cookies: 新登录得到的Cookie对象
+        """
+        self.save(name, cookies)
+        lifetime.record_issued(self.upstream, name)
+
+    def login(self, key: str, func: Callable[[], RequestsCookieJar], share=True) -> RequestsCookieJar:
+        """
+        执行登录，同一凭证的并发登录只执行一次
+
+        :param key: 合并登录的唯一标识，应包含密码摘要
+        :param func: 真正执行登录的函数
+        :param share: 是否使用其他进程以同一标识发布的登录结果，默认True
+        :return: 包含登录凭证的Cookie对象
+        """
+        cookies = single_flight(
+            key,
+            func,
+            self.redis_conn,
+            dumps=cookie_codec.dumps,
+            loads=cookie_codec.loads if share else None,
+            lock_ttl=config.login_lock_ttl,
+            wait_timeout=config.login_wait_timeout
+        )
+        # 合并的调用共享同一个Cookie对象，返回副本避免相互修改
+        return cookies.copy()
@@ -0,0 +1,112 @@
+import secrets
+import time
+from functools import wraps
+from typing import Optional
+
+from flask import g, request, has_request_context
+from werkzeug.datastructures import ImmutableMultiDict
+
+from plugins_v3._login import config
+from utils.exceptions import custom_abort
+from utils.redis_connections import redis_token
+
+
+def _token_key(token: str) -> str:
+    return "token:" + token
+
+
+def _user_key(name: str) -> str:
+    return "tokens:" + name
+
+
+def issue_token(name: str) -> str:
+    """
+    为已通过统一认证的学生签发令牌，令牌对应该学生缓存的各系统会话
+
+    每个学生最多保留 token_max_per_user 个令牌，超出时撤销最早签发的令牌
+
+    :param name: 学号
+    :return: 令牌
+    """
+    token = secrets.token_urlsafe(32)
+    pipe = redis_token.pipeline()
+    pipe.set(_token_key(token), name, ex=config.token_expire)
+    pipe.zadd(_user_key(name), {token: time.time()})
+    pipe.zrange(_user_key(name), 0, -config.token_max_per_user - 1)
+    pipe.expire(_user_key(name), config.token_expire)
+    stale = pipe.execute()[2]
+    if stale:
+        pipe = redis_token.pipeline()
+        pipe.delete(*[_token_key(item) for item in stale])
+        pipe.zrem(_user_key(name), *stale)
+        pipe.execute()
+    return token
+
+
+def resolve_token(token: str) -> Optional[str]:
+    """
+    获取令牌对应的学号，并顺延令牌的有效期
+
+    :param token: 令牌
+    :return: 学号，令牌不存在或已过期时返回None
+    """
+    name = redis_token.get(_token_key(token))
+    if name:
+        pipe = redis_token.pipeline()
+        pipe.expire(_token_key(token), config.token_expire)
+        pipe.expire(_user_key(name), config.token_expire)
+        pipe.execute()
+    return name
+
+
+def revoke_tokens(name: str) -> int:
+    """
+    撤销某个学生的全部令牌，用于退出所有设备或密码已失效的情况
+
+    :param name: 学号
+    :return: 撤销的令牌数量
+    """
+    tokens = redis_token.zrange(_user_key(name), 0, -1)
+    pipe = redis_token.pipeline()
+    if tokens:
+        pipe.delete(*[_token_key(token) for token in tokens])
+    pipe.delete(_user_key(name))
+    pipe.execute()
+    return len(tokens)
+
+
+def token_user() -> Optional[str]:
+    """
+    :return: 本次请求通过令牌认证的学号，未使用令牌时返回None
+    """
+    if not has_request_context():
+        return None
+    return g.get('token_name')
+
+
+def token_auth():
+    """ 允许使用令牌代替账号密码访问接口
+
+    请求带有 token 参数时，将其解析为学号并写入请求参数 name，同时去掉 passwd，
+    后续的缓存、登录等逻辑按该学号直接使用缓存的会话，不再处理密码；
+    令牌无效时返回登录过期。需放在 check_sign 之后，token 参数应参与签名计算
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs) -> dict:
+            token = request.args.get('token')
+            if token:
+                name = resolve_token(token)
+                if not name:
+                    custom_abort(-3, '登录已过期，请重新登录!')
+                g.token_name = name
+                request_args = request.args.to_dict(flat=False)
+                request_args['name'] = [name]
+                request_args.pop('passwd', None)
+                request.args = ImmutableMultiDict(request_args)
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
@@ -3,9 +3,8 @@ from utils.decorators.cache import cache
 from utils.decorators.check_sign import check_sign
 from utils.decorators.request_limit import request_limit
 from utils.exceptions import custom_abort
-from utils.session import session
 from . import api, config
-from .._login.login import login
+from .._login.login import jwxt_request
 
 
 @api.route("/emptyClassroom/<string:building_id>/<int:week_of_term>/<int:day_of_week>/<int:class_of_day>",
@@ -27,9 +26,6 @@ def handle_empty_classroom(building_id: str, week_of_term: int, day_of_week: int
     - code: 状态码，0表示成功
     - data: 空闲教室列表，包含位置、教室号、座位数和座位类型
     """
-    # 使用管理员账号登录获取Cookie
-    cookies = login(NAME, PASSWD)
-
     # 构建请求数据
     post_data = {
         "fwzt": "cx",                      # 查询功能
@@ -44,7 +40,8 @@ def handle_empty_classroom(building_id: str, week_of_term: int, day_of_week: int
     }
     
     # 请求教务系统获取空教室信息
-    items = session.post(config.empty_classroom_url, post_data, cookies=cookies)
+    # 使用管理员账号的缓存Cookie请求，登录失效时会自动重新校验并重试一次
+    items = jwxt_request('post', config.empty_classroom_url, NAME, PASSWD, data=post_data)
     if items.content.decode() == 'null':
         custom_abort(-1, '暂无空闲教室!')
     items = items.json()
@@ -88,9 +85,6 @@ def handle_filter_empty_classroom(building_id: str, week_of_term: int, day_of_we
     - code: 状态码，0表示成功
     - data: 空闲教室列表，包含位置、教室号、座位数和座位类型
     """
-    # 使用管理员账号登录获取Cookie
-    cookies = login(NAME, PASSWD)
-    
     # 计算连续多节课的二进制表示
     section = 0
     for i in range(start_class - 1, end_class):
@@ -110,7 +104,8 @@ def handle_filter_empty_classroom(building_id: str, week_of_term: int, day_of_we
     }
 
     # 请求教务系统获取空教室信息
-    classrooms = session.post(config.empty_classroom_url, post_data, cookies=cookies).json()
+    # 使用管理员账号的缓存Cookie请求，登录失效时会自动重新校验并重试一次
+    classrooms = jwxt_request('post', config.empty_classroom_url, NAME, PASSWD, data=post_data).json()
 
     # 处理返回的空教室数据
     classrooms = classrooms["items"]
@@ -10,4 +10,16 @@ lab_host = 'sygl.nuc.edu.cn'
 # 学生实验页面URL
 student_index_url = 'http://sygl.nuc.edu.cn/aexp/stuIndex.jsp'
 # 实验列表API
-experiment_list_url = 'http://sygl.nuc.edu.cn/aexp/experimentAction/stuExperimentList.action'
\ No newline at end of file
+experiment_list_url = 'http://sygl.nuc.edu.cn/aexp/experimentAction/stuExperimentList.action'
+# 学生左侧菜单页面URL
+lab_left_menu_url = 'http://sygl.nuc.edu.cn/aexp/stuLeft.jsp'
+# 实验教学管理平台首页URL
+lab_teachn_url = 'http://sygl.nuc.edu.cn/teachn/teachnAction/index.action'
+
+# 实验系统单点登录步骤配置，可用步骤：service、cas、ticket、session、student_index、left_menu、teachn
+# 完整步骤，与浏览器登录过程一致
+lab_full_hops = ['service', 'cas', 'ticket', 'session', 'student_index', 'left_menu', 'teachn']
+# 快速路径只执行获取JSESSIONID和aexpsid所必需的步骤，成功后校验Cookie，失败时改用完整步骤，为空表示不使用快速路径
+lab_fast_hops = ['service', 'cas', 'ticket', 'session']
+# 快速路径失败后暂停使用的时间（秒）
+lab_fast_cooldown = 600
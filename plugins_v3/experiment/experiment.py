@@ -2,10 +2,11 @@ import re
 from flask import request
 
 from utils.decorators.check_sign import check_sign
-from utils.session import session
+from plugins_v3._login.session_token import token_auth
+from utils.session import decode_response
 from plugins_v3.experiment import config
 from lxml import etree
-from plugins_v3._login.login import experiment_login
+from plugins_v3._login.login import lab_request
 from utils.decorators.request_limit import request_limit
 from utils.decorators.cache import cache
 from utils.redis_connections import redis_experiment
@@ -14,9 +15,10 @@ from . import api
 
 
 @api.route('/experiment', methods=['GET'])
-@check_sign(check_args={'name', 'passwd'})  # 验证请求签名
+@check_sign(check_args={'name', 'passwd', 'token'})  # 验证请求签名
+@token_auth()                               # 允许使用令牌代替账号密码
 @request_limit(5)                           # 限制请求频率，每分钟最多5次
-@cache({'name'}, 300)                       # 缓存结果300秒
+@cache({'name'}, 300, stale=3600)           # 缓存结果300秒，过期后1小时内先返回旧结果并在后台刷新
 def experiment():
     """
     获取学生实验课程信息
@@ -24,6 +26,7 @@ def experiment():
     查询参数:
     - name: 学号
     - passwd: 密码
+    - token: 登录接口返回的令牌，可代替 name 和 passwd
     
     返回数据:
     - code: 状态码，0表示成功
@@ -34,10 +37,6 @@ def experiment():
     passwd = request.args.get('passwd', type=str)
     
     try:
-        # 登录实验教学管理平台获取Cookie
-        cookies = experiment_login(name, passwd)
-        logging.info(f"成功获取实验系统Cookie: {cookies}")
-        
         # 构建请求头
         headers = {
             'Referer': config.student_index_url,
@@ -52,16 +51,9 @@ def experiment():
         teachn_headers = headers.copy()
         teachn_headers["Referer"] = config.student_index_url
         
-        teachn_response = session.get(teachn_url, headers=teachn_headers, cookies=cookies)
-        teachn_content = None
-        
-        for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-            try:
-                teachn_content = teachn_response.content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-                
+        # 携带缓存的实验系统Cookie访问，登录失效时会自动重新校验并重试一次
+        teachn_response = lab_request(teachn_url, name, passwd, headers=teachn_headers)
+        teachn_content = decode_response(teachn_response)
         if teachn_content:
             # 解析实验课程数据
             experiment_items = parse_experiment_from_teachn(teachn_content)
@@ -98,9 +90,6 @@ def get_experiment_data(name, passwd):
     - 处理后的实验课程列表，添加了isExperiment标记
     """
     try:
-        # 登录实验教学管理平台获取Cookie
-        cookies = experiment_login(name, passwd)
-        
         # 构建请求头
         headers = {
             'Referer': config.student_index_url,
@@ -133,22 +122,17 @@ def get_experiment_data(name, passwd):
             teachn_headers["Referer"] = config.student_index_url
             
             try:
-                teachn_response = session.get(teachn_url, headers=teachn_headers, cookies=cookies)
+                teachn_response = lab_request(teachn_url, name, passwd, headers=teachn_headers)
                 
                 if teachn_response.status_code != 200:
                     logging.error(f"[实验课程] 请求失败，状态码: {teachn_response.status_code}")
+                    current_page += 1
                     continue
                 
-                teachn_content = None
-                for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-                    try:
-                        teachn_content = teachn_response.content.decode(encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
+                teachn_content = decode_response(teachn_response)
                 if not teachn_content:
                     logging.error("[实验课程] 无法解码响应内容")
+                    current_page += 1
                     continue
                 
                 # 解析实验课程数据
@@ -1,18 +1,17 @@
-import logging
-
 from flask import request
 
-from plugins_v3._login.login import login
+from plugins_v3._login.login import jwxt_request
 from utils.decorators.cache import cache
 from utils.decorators.check_sign import check_sign
+from plugins_v3._login.session_token import token_auth
 from utils.decorators.request_limit import request_limit
-from utils.session import session
 from utils.decorators.stopped import stopped
 from . import api, config
 
 
 @api.route('/grade', methods=['GET'])
-@check_sign(check_args={'name', 'passwd'})
+@check_sign(check_args={'name', 'passwd', 'token'})
+@token_auth()
 # @stopped()
 @request_limit()
 def handle_grade():
@@ -22,6 +21,7 @@ def handle_grade():
     请求参数:
     - name: 学号
     - passwd: 密码
+    - token: 登录接口返回的令牌，可代替 name 和 passwd
     
     返回数据:
     - code: 状态码，0表示成功
@@ -31,9 +31,6 @@ def handle_grade():
     name = request.args.get('name', type=str)
     passwd = request.args.get('passwd', type=str)
     
-    # 登录获取Cookie
-    cookies = login(name, passwd)
-    
     # 构建请求数据，空的xnm和xqm表示查询所有学期
     post_data = {
         'xnm': '',                    # 学年，空表示所有学年
@@ -42,14 +39,8 @@ def handle_grade():
         '_search': 'false'            # 是否搜索模式
     }
     
-    try:
-        # 请求教务系统获取成绩信息
-        grade = session.post(config.grade_url, post_data, cookies=cookies).json()
-    except Exception:
-        # 如果请求失败，尝试重新登录并再次请求
-        cookies = login(name, passwd, True)  # 强制重新登录
-        grade = session.post(config.grade_url, post_data, cookies=cookies).json()
-        logging.warning("捕获成绩查询异常!")
+    # 请求教务系统获取成绩信息，登录失效时会自动重新校验并重试一次
+    grade = jwxt_request('post', config.grade_url, name, passwd, hedge=True, data=post_data).json()
     
     # 处理返回的成绩数据，按学期分组
     grade_items = {}
@@ -5,6 +5,5 @@ douban_headers = {
     "Accept": "*/*",
     "Sec-Fetch-Site": "cross-site",
     "Sec-Fetch-Mode": "cors",
-    "Accept-Encoding": "gzip",
     "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
 }
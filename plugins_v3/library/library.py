@@ -12,7 +12,8 @@ from utils.decorators.check_sign import check_sign
 from utils.decorators.request_limit import request_limit
 from utils.exceptions import custom_abort
 from utils.gol import global_values
-from utils.session import session
+from utils.hedge import hedged_request
+from utils.session import session, decode_response
 from . import api, config
 import logging
 
@@ -53,14 +54,7 @@ def handle_library_search_by_name(keyword: str):
     
     # 发送请求获取搜索结果页面
     response = session.get(url)
-    content = None
-    for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-        try:
-            content = response.content.decode(encoding)
-            break
-        except UnicodeDecodeError:
-            continue
-            
+    content = decode_response(response)
     if not content:
         logging.error("无法解码图书搜索响应内容")
         custom_abort(-1, '图书搜索服务暂时无法访问，请稍后再试!')
@@ -172,7 +166,7 @@ def get_book_available_detail(book_id: str):
     url = "http://222.31.39.3:8080/pft/showmarc/showbookitems.asp?nTmpKzh=%s" % book_id
     
     # 发送请求获取图书馆藏信息页面
-    content = session.get(url).content.decode("utf-8")
+    content = hedged_request('get', url).content.decode("utf-8")
     
     # 解析HTML获取馆藏信息
     soups = bs4.BeautifulSoup(content, "html.parser")
@@ -208,24 +202,16 @@ def book_detail(book_id) -> dict:
     """
     # 获取图书基本信息
     url = "http://222.31.39.3:8080/pft/showmarc/table.asp?nTmpKzh=%s" % book_id
-    content = session.get(url).content
+    content = hedged_request('get', url).content
     soups = bs4.BeautifulSoup(content, "html.parser")
     details = soups.find(id="tabs-2").find_all("tr")
     
     # 获取图书可借阅数量
     url = "http://222.31.39.3:8080/pft/wxjs/BK_getKJFBS.asp"
     post_data = {"nkzh": book_id}
-    response = session.post(url, data=post_data, headers={'Cookie': global_values.get_value('vpn_cookie')})
-    
-    # 尝试使用不同的编码方式解码内容
-    content = None
-    for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']:
-        try:
-            content = response.content.decode(encoding)
-            break
-        except UnicodeDecodeError:
-            continue
-            
+    response = hedged_request('post', url, data=post_data, headers={'Cookie': global_values.get_value('vpn_cookie')})
+    
+    content = decode_response(response)
     if not content:
         logging.error("无法解码图书可借阅数量响应内容")
         content = "0"  # 如果解码失败，默认为0
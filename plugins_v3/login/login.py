@@ -2,7 +2,9 @@
 
 from flask import request
 
-from plugins_v3._login.login import login
+from plugins_v3._login import config
+from plugins_v3._login.login import login, verify_credential
+from plugins_v3._login.session_token import issue_token, revoke_tokens, token_auth, token_user
 from utils.decorators.check_sign import check_sign
 from utils.decorators.request_limit import request_limit
 from utils.exceptions import custom_abort
@@ -17,7 +19,35 @@ def handle_login():
     passwd = request.args.get('passwd', type=str)
     if len(name) == 8 or name[0].isalpha():
         custom_abort(-1, '小程序只支持本科生登录!')
-    login(name, passwd, True)
+    # 密码与最近一次验证通过的一致且会话仍然有效时直接返回，否则重新登录
+    if not verify_credential(name, passwd):
+        login(name, passwd, True)
+    return {
+        'code': 0,
+        'message': 'OK',
+        'data': {
+            # 其他接口可使用令牌代替账号密码，令牌在有效期内每次使用后顺延
+            'token': issue_token(name),
+            'expire': config.token_expire
+        }
+    }
+
+
+@api.route('/logout', methods=['GET'])
+@check_sign(check_args={'token'})
+@token_auth()
+@request_limit()
+def handle_logout():
+    """
+    撤销当前学生在所有设备上的令牌
+
+    请求参数:
+    - token: 登录接口返回的令牌
+    """
+    name = token_user()
+    if not name:
+        custom_abort(-3, '登录已过期，请重新登录!')
+    revoke_tokens(name)
     return {
         'code': 0,
         'message': 'OK'
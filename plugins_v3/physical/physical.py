@@ -3,15 +3,17 @@ from flask import request
 from utils.exceptions import custom_abort
 from . import api
 from utils.decorators.check_sign import check_sign
+from plugins_v3._login.session_token import token_auth
 from utils.session import session
 from plugins_v3.physical import config
-from plugins_v3._login.login import physical_login
+from plugins_v3._login.login import physical_request
 from utils.decorators.request_limit import request_limit
 from utils.decorators.cache import cache
 
 
 @api.route('/physical', methods=['GET'])
-@check_sign(check_args={'name', 'passwd'})  # 验证请求签名
+@check_sign(check_args={'name', 'passwd', 'token'})  # 验证请求签名
+@token_auth()                               # 允许使用令牌代替账号密码
 @request_limit(5)                           # 限制请求频率，每分钟最多5次
 @cache({'name'}, 300)                       # 缓存结果300秒
 def physical():
@@ -21,6 +23,7 @@ def physical():
     查询参数:
     - name: 学号
     - passwd: 密码
+    - token: 登录接口返回的令牌，可代替 name 和 passwd
     
     返回数据:
     - code: 状态码，0表示成功
@@ -30,14 +33,8 @@ def physical():
     name = request.args.get('name', type=str)
     passwd = request.args.get('passwd', type=str)
     
-    # 登录体育管理系统获取Cookie
-    cookies = physical_login(name, passwd)
-    
-    # 访问预处理页面
-    session.get(url=config.pre_url, cookies=cookies)
-    
-    # 获取用户ID
-    rs = session.post(url=config.sys_url, cookies=cookies)
+    # 携带缓存的体育系统Cookie获取用户ID
+    rs = physical_request('POST', config.sys_url, name, passwd)
     userid = rs.json()['data'][0]['sysUser']['id']
     
     # 构建请求数据
@@ -46,7 +43,7 @@ def physical():
     }
     
     # 请求体测总成绩数据
-    rq = session.post(url=config.index_url, data=post_data, cookies=cookies).json()
+    rq = physical_request('POST', config.index_url, name, passwd, data=post_data).json()
     if rq['returnCode'] != '200':
         custom_abort(-1, rq['returnMsg'])
     
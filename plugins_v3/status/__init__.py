@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+api = Blueprint('status_v3', __name__, url_prefix='/v3')
+
+from .status import *
@@ -0,0 +1,137 @@
+from flask import request
+
+from plugins_v3._login import lifetime
+from utils import local_cache, metrics
+from utils.circuit_breaker import states as breaker_states
+from utils.gol import global_values
+from utils.proxy_manager import proxy_manager
+from utils.session import adapters, pool_stats
+from . import api
+
+
+@api.route('/status/sessions', methods=['GET'])
+def handle_session_status():
+    """
+    获取各上游系统会话寿命的当前估计
+
+    返回数据:
+    - code: 状态码，0表示成功
+    - data: 以上游系统为键的估计结果
+      - samples: 寿命样本数（含仍然有效的截尾样本）
+      - deaths: 观察到失效的样本数
+      - p10/p50/p90: 寿命分位数（秒），样本不足时为null
+      - ttl: 当前使用的Cookie缓存时间（秒）
+      - trustWindow: 当前使用的校验信任窗口（秒）
+    """
+    return {
+        'code': 0,
+        'data': {upstream: lifetime.estimate(upstream) for upstream in lifetime.upstreams}
+    }
+
+
+@api.route('/status/metrics', methods=['GET'])
+def handle_metrics_status():
+    """
+    获取本进程的运行计数
+
+    查询参数:
+    - prefix: 只返回以此前缀开头的计数，如 login_failure_cache
+
+    返回数据:
+    - code: 状态码，0表示成功
+    - data: 计数名称到计数的字典
+    """
+    return {
+        'code': 0,
+        'data': metrics.snapshot(request.args.get('prefix', ''))
+    }
+
+
+@api.route('/status/upstreams', methods=['GET'])
+def handle_upstream_status():
+    """
+    获取本进程各上游系统连接池的使用情况，连接等待时间见 /status/metrics 中的 http.<系统>.pool_wait.ms
+
+    返回数据:
+    - code: 状态码，0表示成功
+    - data: 以上游系统为键的连接池状态
+      - inFlight/peakInFlight: 正在进行及同时进行的最大请求数
+      - poolMaxsize: 每个主机的连接池大小
+      - utilization: 正在进行的请求数占连接池大小的比例
+      - idleConnections: 空闲连接数
+      - connectionsCreated: 累计新建的连接数
+    """
+    return {
+        'code': 0,
+        'data': pool_stats()
+    }
+
+
+@api.route('/status/health', methods=['GET'])
+def handle_health_status():
+    """
+    获取本进程与各上游主机的连通状态
+
+    返回数据:
+    - code: 状态码，0表示成功
+    - data:
+      - proxyOk: 保活任务最近一次访问教务系统是否成功
+      - breakers: 以主机为键的熔断器状态
+        - state: closed 正常 / open 熔断中 / half_open 等待探测请求
+        - failures: 连续失败次数
+        - rejected: 累计直接拒绝的请求数
+        - openedAt: 最近一次打开的时间戳
+    """
+    return {
+        'code': 0,
+        'data': {
+            'proxyOk': bool(global_values.get_value('proxy_status_ok')),
+            'breakers': breaker_states()
+        }
+    }
+
+
+@api.route('/status/proxies', methods=['GET'])
+def handle_proxy_status():
+    """
+    获取本进程经由各代理的连接复用情况，包括上游请求和保活请求
+
+    返回数据:
+    - code: 状态码，0表示成功
+    - data: 各代理的统计
+      - proxy: 代理序号（#1 起），不包含代理地址
+      - current: 是否为当前使用的代理
+      - requests: 经由该代理的请求数
+      - connectionsCreated: 新建的连接数
+      - reuseRatio: 复用已有连接的请求所占比例
+    """
+    return {
+        'code': 0,
+        'data': proxy_manager.stats(adapters.values())
+    }
+
+
+@api.route('/status/cache', methods=['GET'])
+def handle_cache_status():
+    """
+    获取本进程接口缓存各层的命中情况
+
+    返回数据:
+    - code: 状态码，0表示成功
+    - data:
+      - tiers: local 进程内缓存 / redis Redis缓存，各自的 hit、miss 和命中率 hitRatio
+      - local: 以接口为键的进程内缓存条目数 size 及容量 maxsize
+    """
+    counters = metrics.snapshot('cache.')
+    tiers = {}
+    for tier in ('local', 'redis'):
+        hit = counters.get('cache.' + tier + '.hit', 0)
+        miss = counters.get('cache.' + tier + '.miss', 0)
+        tiers[tier] = {'hit': hit, 'miss': miss, 'hitRatio': round(hit / (hit + miss), 3) if hit + miss else None}
+    return {
+        'code': 0,
+        'data': {
+            'tiers': tiers,
+            'local': local_cache.stats()
+        }
+    }
@@ -1,15 +1,16 @@
 from flask import request
-from plugins_v3._login.login import login
+from plugins_v3._login.login import jwxt_request
 from utils.decorators.check_sign import check_sign
+from plugins_v3._login.session_token import token_auth
 from utils.decorators.request_limit import request_limit
-from utils.session import session
 from . import api, config
 from utils.decorators.cache import cache
 from lxml import etree
 
 
 @api.route('/studies', methods=['GET'])
-@check_sign({'name', 'passwd'})  # 验证请求签名
+@check_sign({'name', 'passwd', 'token'})  # 验证请求签名
+@token_auth()                    # 允许使用令牌代替账号密码
 @request_limit()                 # 限制请求频率
 @cache({'name'}, 180)            # 缓存结果180秒
 def handle_studies():
@@ -19,6 +20,7 @@ def handle_studies():
     请求参数:
     - name: 学号
     - passwd: 密码
+    - token: 登录接口返回的令牌，可代替 name 和 passwd
     
     返回数据:
     - code: 状态码，0表示成功
@@ -28,9 +30,6 @@ def handle_studies():
     name = request.args.get('name', type=str)
     passwd = request.args.get('passwd', type=str)
     
-    # 登录获取Cookie
-    cookies = login(name, passwd)
-    
     # 构建请求数据
     post_data = {
         '_search': 'false',
@@ -38,9 +37,9 @@ def handle_studies():
     
     studies_list = []
     # 获取课程类型统计数据
-    studies = session.post(config.studies_url, post_data, cookies=cookies).json()
+    studies = jwxt_request('post', config.studies_url, name, passwd, data=post_data).json()
     # 获取所有课程的平均GPA
-    all_studies = get_all_studies(cookies)
+    all_studies = get_all_studies(name, passwd)
     
     # 处理每种课程类型的数据
     studies = studies['items']
@@ -62,18 +61,19 @@ def handle_studies():
     }
 
 
-def get_all_studies(cookies):
+def get_all_studies(name, passwd):
     """
     获取所有课程的平均GPA
     
     参数:
-    - cookies: 登录后的Cookie
+    - name: 学号
+    - passwd: 密码
     
     返回:
     - 所有课程的平均GPA值
     """
     # 请求获取所有课程GPA的页面
-    rq = session.get(url=config.all_studies_url, cookies=cookies).content.decode()
+    rq = jwxt_request('get', config.all_studies_url, name, passwd, expect_json=False).content.decode()
     # 解析HTML获取GPA值
     tree = etree.HTML(rq)
     all_studies = tree.xpath('normalize-space(//*[@id="alertBox"]/font[2]/font/text())')
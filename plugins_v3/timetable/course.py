@@ -3,8 +3,7 @@ import logging
 from flask import request
 
 from global_config import post_data as glo_data
-from utils.session import session
-from plugins_v3._login.login import login
+from plugins_v3._login.login import jwxt_request
 from plugins_v3.timetable import config
 
 def get_class_data(name, passwd):
@@ -19,8 +18,6 @@ def get_class_data(name, passwd):
     - 普通课程列表
     """
     try:
-        # 登录获取Cookie
-        cookies = login(name, passwd)
         # 构建请求数据
         post_data = {
             'xnm': glo_data['xnm'],  # 学年
@@ -28,7 +25,7 @@ def get_class_data(name, passwd):
             'kzlx': 'ck'  # 查看类型
         }
         # 请求教务系统获取课表数据
-        response = session.post(config.timetable_url, data=post_data, cookies=cookies)
+        response = jwxt_request('post', config.timetable_url, name, passwd, data=post_data)
         
         # 构建课表项目
         class_items = build_class_items(response.json())
@@ -3,6 +3,7 @@ from flask import request
 
 from utils.decorators.cache import cache
 from utils.decorators.check_sign import check_sign
+from plugins_v3._login.session_token import token_auth
 from utils.decorators.request_limit import request_limit
 from . import api
 # 导入实验课程相关函数
@@ -12,7 +13,8 @@ from plugins_v3.timetable.course import get_class_data
 
 
 @api.route('/timetable', methods=['GET'])
-@check_sign(check_args={'name', 'passwd'})
+@check_sign(check_args={'name', 'passwd', 'token'})
+@token_auth()
 # @stopped()
 @request_limit()
 def handle_timetable():
@@ -22,6 +24,7 @@ def handle_timetable():
     请求参数:
     - name: 学号
     - passwd: 密码
+    - token: 登录接口返回的令牌，可代替 name 和 passwd
     
     返回数据:
     - code: 状态码，0表示成功
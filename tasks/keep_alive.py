@@ -1,80 +1,132 @@
 from datetime import datetime, time
 import logging
+import time as timer
+from urllib.parse import urlsplit
+
+import gevent
 import requests
-from global_config import PHONE, enableProxy, proxy_list
+from global_config import PHONE, enableProxy, proxy_list, proxy_probe_targets, proxy_probe_min_interval, \
+    proxy_probe_max_interval, proxy_probe_timeout, proxy_rotation_policy
 # from utils.send_message import sendmessage  # 注释掉短信发送模块导入
 from utils.scheduler import scheduler
-from utils.session import session
 from utils.proxy_manager import proxy_manager  # 导入新的代理管理器
 from utils.gol import global_values
+from utils.circuit_breaker import get_breaker
 
-url = "https://zhjw.nuc.edu.cn/jwglxt/xtgl/index_initMenu.html?jsdm=xs&_t=1599980405581&ticket=ST-206697-Sd004wk15bKfNUsbirLI-zfsoft.com"
 midnight = time(0, 0)
 morning = time(7, 25)
 # 记录连续失败次数
 consecutive_failures = 0
 # 最大连续失败次数，超过此值才发出警告
 max_failures_before_warning = 3
+# (代理索引, 上游系统) -> 当前探测间隔(秒)、下次探测时间、最近一次探测是否成功
+probe_intervals = {}
+next_probe = {}
+probe_ok = {}
+
+
+def probe(index: int, upstream: str, url: str):
+    """
+    经由指定代理探测一个上游系统，结果计入代理选择的延迟和失败率，并调整该组合的探测间隔
+
+    上游返回任意非5xx响应即视为连通；成功时探测间隔加倍，失败时恢复为最小间隔
+
+    :param index: 代理索引
+    :param upstream: 上游系统名称
+    :param url: 探测URL
+    """
+    key = (index, upstream)
+    start = timer.time()
+    try:
+        response = proxy_manager.sessions[index].get(url, timeout=proxy_probe_timeout, allow_redirects=False)
+        ok = response.status_code < 500
+    except requests.RequestException as e:
+        logging.debug(f'经由代理 {proxy_manager.proxy_names[index]} 无法连接 {upstream}: {type(e).__name__}')
+        ok = False
+    proxy_manager.record(index, upstream, timer.time() - start, not ok)
+    if ok:
+        probe_intervals[key] = min(probe_intervals.get(key, proxy_probe_min_interval) * 2, proxy_probe_max_interval)
+    else:
+        probe_intervals[key] = proxy_probe_min_interval
+    next_probe[key] = timer.time() + probe_intervals[key]
+    probe_ok[key] = ok
+
 
 def keep_alive():
     """
-    保持与教务系统的连接
-    
-    当无法连接教务系统时立即切换到下一个代理
+    保持与各校内系统的连接，并发探测每个代理到各上游系统的连通性
+
+    探测结果用于代理选择，round_robin 策略下当前代理无法连接教务系统时切换到最好的代理；
     在凌晨0点到早上7点25分之间不发送警报，以避免干扰
     """
     global consecutive_failures
-    
+
     if not enableProxy:
         # 如果禁用了代理功能，则跳过保活检查
         return
-    
+
     # 如果没有配置代理，则跳过检查
     if not proxy_list or len(proxy_list) == 0:
         return
-        
-    try:
-        # 使用当前系统代理发起请求
-        response = proxy_manager.get(url, timeout=10, allow_redirects=False)
-        
-        # 检查响应状态码，302表示连接正常
-        if response.status_code == 302:
-            # 连接成功，重置连续失败计数
-            if consecutive_failures > 0:
-                logging.info(f'恢复与教务系统的连接，之前连续失败 {consecutive_failures} 次')
-                consecutive_failures = 0
-            
-            # 设置代理状态为正常
-            global_values.set_value("proxy_status_ok", True)
-            return
-            
-    except requests.RequestException as e:
-        # 请求异常，立即切换到下一个代理
-        logging.warning(f'无法连接至教务系统! 错误: {type(e).__name__}')
-        logging.debug(f'错误详情: {str(e)}')
-        
-        # 切换到下一个代理
-        proxy_manager.switch_to_next_proxy()
-        
-        # 增加连续失败计数
-        consecutive_failures += 1
-        
-        # 设置代理状态为不正常
-        global_values.set_value("proxy_status_ok", False)
-        
-        # 判断是否需要发出警告（避免刷屏）
-        current_time = datetime.now().time()
-        if (current_time < midnight or current_time > morning) and consecutive_failures >= max_failures_before_warning:
-            logging.warning(f'无法连接至教务系统! 连续失败 {consecutive_failures} 次，已切换代理')
-            
-            # 注释掉短信发送相关代码
-            # for phone in PHONE:
-            #     result = sendmessage([datetime.now().strftime("%H:%M:%S")], phone, '1908936')
-            #     if result == 'Ok':
-            #         logging.error("已向{}发送警报!".format(phone))
-            #         break
-            #     logging.error(result)
-            #     logging.error("短信发送异常!")
-
-
-scheduler.add_job(keep_alive, 'interval', seconds=15, next_run_time=datetime.now())
+
+    # 只探测到期的代理和上游组合
+    now = timer.time()
+    due = [(index, upstream, url) for index in range(len(proxy_manager.formatted_proxies))
+           for upstream, url in proxy_probe_targets.items() if next_probe.get((index, upstream), 0) <= now]
+    gevent.joinall([gevent.spawn(probe, *item) for item in due])
+    probed = {upstream for _, upstream, _ in due}
+    indexes = range(len(proxy_manager.formatted_proxies))
+
+    # 各上游系统只要有一个代理可以连接即视为可用，结果同步到该主机的熔断器，连接恢复后无需等待探测即可放行请求
+    for upstream in probed:
+        breaker = get_breaker(urlsplit(proxy_probe_targets[upstream]).hostname)
+        if any(probe_ok.get((index, upstream)) for index in indexes):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    if 'jwxt' not in probed:
+        return
+
+    # round_robin 策略下当前代理无法连接教务系统时，切换到教务系统权重最高的代理
+    if proxy_rotation_policy == 'round_robin' and probe_ok.get((proxy_manager.current_proxy_index, 'jwxt')) is False:
+        best = proxy_manager.best_proxy('jwxt')
+        if best != proxy_manager.current_proxy_index and probe_ok.get((best, 'jwxt')):
+            proxy_manager.use_proxy(best)
+
+    if any(probe_ok.get((index, 'jwxt')) for index in indexes):
+        # 连接成功，重置连续失败计数
+        if consecutive_failures > 0:
+            logging.info(f'恢复与教务系统的连接，之前连续失败 {consecutive_failures} 次')
+            consecutive_failures = 0
+
+        # 设置代理状态为正常
+        global_values.set_value("proxy_status_ok", True)
+        return
+
+    # 所有代理都无法连接教务系统
+    logging.warning('无法经由任何代理连接至教务系统!')
+
+    # 增加连续失败计数
+    consecutive_failures += 1
+
+    # 设置代理状态为不正常
+    global_values.set_value("proxy_status_ok", False)
+
+    # 判断是否需要发出警告（避免刷屏）
+    current_time = datetime.now().time()
+    if (current_time < midnight or current_time > morning) and consecutive_failures >= max_failures_before_warning:
+        logging.warning(f'无法连接至教务系统! 连续失败 {consecutive_failures} 次')
+
+        # 注释掉短信发送相关代码
+        # for phone in PHONE:
+        #     result = sendmessage([datetime.now().strftime("%H:%M:%S")], phone, '1908936')
+        #     if result == 'Ok':
+        #         logging.error("已向{}发送警报!".format(phone))
+        #         break
+        #     logging.error(result)
+        #     logging.error("短信发送异常!")
+
+
+scheduler.add_job(keep_alive, 'interval', seconds=proxy_probe_min_interval, next_run_time=datetime.now(),
+                  max_instances=1, coalesce=True)
@@ -0,0 +1,17 @@
+from plugins_v3._login import config, flow_pool
+from utils.gol import global_values
+from utils.scheduler import scheduler
+
+
+def refill_login_flows():
+    """
+    定时补充预热的CAS登录流程，并清理超过最大可用时长的流程，代理不可用时跳过
+    """
+    if not global_values.get_value("proxy_status_ok"):
+        return
+    for re_url in config.login_flow_pool_urls:
+        flow_pool.refill(re_url)
+
+
+scheduler.add_job(refill_login_flows, 'interval', seconds=config.login_flow_refill_interval,
+                  max_instances=1, coalesce=True)
@@ -0,0 +1,84 @@
+import logging
+import time
+
+from gevent.pool import Pool
+
+from plugins_v3._login import config
+from plugins_v3._login.login import zhjw_sessions, sygl_sessions, tygl_sessions
+from utils.gol import global_values
+from utils.redis_connections import redis_session, redis_experiment
+from utils.scheduler import scheduler
+
+# 各Redis连接及其中缓存的会话
+_caches = [
+    (redis_session, [zhjw_sessions, tygl_sessions]),
+    (redis_experiment, [sygl_sessions]),
+]
+
+
+def refresh_sessions():
+    """
+    后台刷新活跃账号的教务系统、实验系统和体育系统会话
+
+    在会话距上次校验超过 session_refresh_age 后、上游会话空闲失效前主动校验一次，
+    使用户请求始终落在信任窗口内，不必在请求路径上等待校验或重新登录。
+    每次最多刷新 session_refresh_budget 个会话，并发数不超过 session_refresh_concurrency，
+    代理不可用时跳过本轮刷新。
+    """
+    if not global_values.get_value("proxy_status_ok"):
+        return
+
+    now = time.time()
+    due = []
+    # 各会话的活跃账号记录在会话缓存所在的Redis中
+    for redis_conn, caches in _caches:
+        due += _due_sessions(redis_conn, caches, now)
+    if not due:
+        return
+
+    # 优先刷新最久未校验的会话
+    due.sort(key=lambda item: item[0])
+    due = due[:config.session_refresh_budget]
+    pool = Pool(config.session_refresh_concurrency)
+    results = pool.map(_refresh_one, due)
+    logging.info("后台刷新会话 %s 个，失效 %s 个", len(results), results.count(False))
+
+
+def _due_sessions(redis_conn, caches, now: float) -> list:
+    """
+    :param redis_conn: 会话缓存所在的Redis连接
+    :param caches: 该Redis中缓存的会话
+    :param now: 当前时间
+    :return: 需要刷新的会话，(上次校验时间, 刷新函数, 学号) 的列表
+    """
+    # 清理超出活跃窗口的账号
+    pipe = redis_conn.pipeline()
+    pipe.zremrangebyscore(config.active_sessions_key, 0, now - config.session_active_window)
+    pipe.zrange(config.active_sessions_key, 0, -1)
+    names = [name.decode() for name in pipe.execute()[-1]]
+    if not names:
+        return []
+
+    # 批量读取各会话的上次校验时间
+    pipe = redis_conn.pipeline()
+    for name in names:
+        pipe.mget(*[cache.validated_prefix + name for cache in caches])
+    due = []
+    for name, validated in zip(names, pipe.execute()):
+        for validated_at, cache in zip(validated, caches):
+            if validated_at and now - float(validated_at) >= config.session_refresh_age:
+                due.append((float(validated_at), cache.refresh, name))
+    return due
+
+
+def _refresh_one(item) -> bool:
+    _, refresh, name = item
+    try:
+        return refresh(name)
+    except Exception as e:
+        logging.warning("后台刷新 %s 的会话失败: %s", name, e)
+        return False
+
+
+scheduler.add_job(refresh_sessions, 'interval', seconds=config.session_refresh_interval,
+                  max_instances=1, coalesce=True)
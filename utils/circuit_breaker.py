@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Dict
+
+from requests.exceptions import ConnectionError
+
+from global_config import circuit_breaker_failures, circuit_breaker_recovery
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    单个上游主机的熔断器
+
+    连续失败 failure_threshold 次后打开，打开期间直接拒绝请求；
+    经过 recovery_timeout 秒后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, host: str, failure_threshold: int = circuit_breaker_failures,
+                 recovery_timeout: float = circuit_breaker_recovery):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """
+        :return: 是否允许发起请求
+        """
+        if self.state == OPEN and time.time() - self.opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logging.info("%s 恢复正常，熔断器关闭", self.host)
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def release(self):
+        """
+        放行的请求未得出成功或失败的结论（如剩余时间不足、发送前出错、请求被取消）时调用，归还半开状态的探测名额
+        """
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            logging.warning("%s 连续失败 %s 次，熔断器打开", self.host, self.failures)
+            self.state = OPEN
+            self.opened_at = time.time()
+
+    def snapshot(self) -> dict:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'openedAt': self.opened_at or None,
+        }
+
+
+# 各上游主机的熔断器，主机名 -> 熔断器
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """
+    :param host: 主机名
+    :return: 该主机的熔断器，不存在时创建
+    """
+    breaker = breakers.get(host)
+    if breaker is None:
+        breaker = breakers.setdefault(host, CircuitBreaker(host))
+    return breaker
+
+
+def states() -> Dict[str, dict]:
+    """
+    :return: 各主机熔断器的状态
+    """
+    return {host: breaker.snapshot() for host, breaker in breakers.items()}
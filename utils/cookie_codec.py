@@ -0,0 +1,47 @@
+import json
+import pickle
+from http.cookiejar import Cookie
+
+from requests.cookies import RequestsCookieJar
+
+# 序列化格式版本，格式为 [版本, [[name, value, domain, path, expires, secure], ...]]
+VERSION = 1
+
+
+def dumps(cookies: RequestsCookieJar) -> bytes:
+    """
+    将Cookie对象序列化为紧凑的JSON字节串
+
+    只保留发送请求需要的字段，不依赖 requests 内部的类结构
+
+    :param cookies: Cookie对象
+    :return: 序列化后的字节串
+    """
+    items = [[cookie.name, cookie.value, cookie.domain, cookie.path, cookie.expires, int(cookie.secure)]
+             for cookie in cookies]
+    return json.dumps([VERSION, items], ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def loads(data: bytes) -> RequestsCookieJar:
+    """
+    将字节串反序列化为Cookie对象
+
+    兼容旧版本使用 pickle 序列化的缓存
+
+    :param data: dumps 生成的字节串或旧的 pickle 数据
+    :return: Cookie对象
+    """
+    # pickle 协议2及以上以 \x80 开头，JSON 格式以 [ 开头
+    if data[:1] == b'\x80':
+        return pickle.loads(data)
+    version, items = json.loads(data)
+    if version != VERSION:
+        raise ValueError('不支持的Cookie序列化版本: {}'.format(version))
+    cookies = RequestsCookieJar()
+    # 直接写入内部字典，避免逐个 set_cookie 加锁及 create_cookie 的参数处理开销
+    jar = cookies._cookies
+    for name, value, domain, path, expires, secure in items:
+        cookie = Cookie(0, name, value, None, False, domain, bool(domain), domain.startswith('.'),
+                        path, bool(path), bool(secure), expires, False, None, None, {'HttpOnly': None})
+        jar.setdefault(domain, {}).setdefault(path, {})[name] = cookie
+    return cookies
@@ -0,0 +1,33 @@
+import hashlib
+import hmac
+import secrets
+
+from global_config import credential_salt
+from utils.redis_connections import redis_session
+
+# 进程内缓存的盐值
+_salt = credential_salt.encode() if credential_salt else None
+
+
+def _get_salt() -> bytes:
+    """
+    获取计算密码摘要使用的盐值
+
+    未通过环境变量配置时，在Redis中生成一个随机盐值供所有进程共用
+    """
+    global _salt
+    if _salt is None:
+        redis_session.set("credential_salt", secrets.token_hex(32), nx=True)
+        _salt = redis_session.get("credential_salt")
+    return _salt
+
+
+def password_digest(name: str, passwd: str) -> str:
+    """
+    计算账号密码的加盐摘要，用于在缓存中标识一组凭证而不保存密码本身
+
+    :param name: 学号
+    :param passwd: 密码
+    :return: 16进制摘要
+    """
+    return hmac.new(_get_salt(), (name + ':' + passwd).encode(), hashlib.sha256).hexdigest()
@@ -0,0 +1,97 @@
+import logging
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from flask import g, has_request_context, request
+
+from utils.exceptions import custom_abort
+
+
+def start(budget: float):
+    """
+    为当前请求设置总耗时上限，之后的每次上游请求只能使用剩余的时间
+
+    :param budget: 总耗时上限（秒）
+    """
+    g.deadline = time.time() + budget
+    g.upstream_hops = []
+
+
+def remaining() -> Optional[float]:
+    """
+    :return: 当前请求剩余的时间（秒），不在请求上下文中或未设置上限时返回None
+    """
+    if not has_request_context() or 'deadline' not in g:
+        return None
+    return g.deadline - time.time()
+
+
+def expired() -> bool:
+    """
+    :return: 当前请求是否已超过总耗时上限
+    """
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def clamp_timeout(timeout, left: float):
+    """
+    将请求的超时时间限制在剩余时间内
+
+    :param timeout: 原超时时间，可以是数值或 (连接超时, 读取超时)
+    :param left: 剩余时间（秒）
+    :return: 限制后的超时时间
+    """
+    if isinstance(timeout, tuple):
+        return tuple(left if value is None else min(value, left) for value in timeout)
+    return left if timeout is None else min(timeout, left)
+
+
+def clamped_parts(timeout, clamped) -> Tuple[bool, bool]:
+    """
+    :param timeout: 原超时时间，可以是数值或 (连接超时, 读取超时)
+    :param clamped: clamp_timeout 限制后的超时时间
+    :return: 连接超时和读取超时是否分别被缩短
+    """
+    def parts(value):
+        return value if isinstance(value, tuple) else (value, value)
+
+    return tuple(before != after for before, after in zip(parts(timeout), parts(clamped)))
+
+
+def record_hop(upstream: str, url: str, elapsed: float):
+    """
+    记录一次上游请求的耗时
+
+    :param upstream: 上游系统名称
+    :param url: 请求URL
+    :param elapsed: 耗时（秒）
+    """
+    if has_request_context() and 'upstream_hops' in g:
+        g.upstream_hops.append((upstream, urlsplit(url).path, elapsed))
+
+
+def message() -> str:
+    """
+    :return: 超时的错误信息，指出耗时最长的上游请求
+    """
+    hops = g.get('upstream_hops') if has_request_context() else None
+    if not hops:
+        return '请求超时，请稍后再试!'
+    upstream, path, elapsed = max(hops, key=lambda hop: hop[2])
+    return '请求超时，{} {} 耗时{:.1f}秒，请稍后再试!'.format(upstream, path, elapsed)
+
+
+def abort(upstream: str, url: str):
+    """
+    当前请求已超过总耗时上限，不再发起上游请求
+
+    :param upstream: 即将请求的上游系统名称
+    :param url: 即将请求的URL
+    """
+    hops = g.get('upstream_hops') or []
+    logging.warning("请求 %s 超时，放弃请求 %s %s，已完成的上游请求: %s", request.path, upstream,
+                    urlsplit(url).path,
+                    ', '.join('{} {} {:.2f}s'.format(*hop) for hop in hops))
+    custom_abort(-1, message())
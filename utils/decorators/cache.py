@@ -4,26 +4,67 @@ import logging
 from functools import wraps
 from urllib.parse import unquote
 
-from flask import request, g
+import gevent
+from flask import request, g, copy_current_request_context
 
+from global_config import local_cache_max_ttl, local_cache_size, request_deadline
+from utils import deadline, metrics
+from utils.local_cache import LocalCache, publish_invalidation, start_listener
 from utils.redis_connections import redis_cache
 
 
-def cache(cache_args: set, expire: int = 600):
+def cache(cache_args: set, expire: int = 600, local_size: int = local_cache_size, stale: int = 0):
     """ 缓存请求，若命中缓存直接返回
     
     该装饰器用于缓存API响应结果，减少重复请求对后端系统的压力。
     工作原理：
     1. 根据指定的请求参数生成缓存键
-    2. 检查Redis中是否存在对应的缓存
-    3. 如果缓存存在，直接返回缓存结果
-    4. 如果缓存不存在，执行原函数并缓存结果
+    2. 依次检查进程内缓存和Redis中是否存在对应的缓存
+    3. 如果缓存存在，直接返回缓存结果，Redis命中时同时写入进程内缓存
+    4. 如果缓存不存在，执行原函数并缓存结果，并通知其他进程删除旧的进程内缓存
+
+    进程内缓存的有效期不超过Redis中的剩余有效期，且不超过 local_cache_max_ttl
+
+    设置 stale 时，缓存过期后的 stale 秒内仍直接返回旧的结果，响应中带有 stale: true，
+    同时只由一个后台协程重新执行原函数刷新缓存；刷新失败时继续返回旧的结果，直到超过 stale 秒
 
     :param cache_args: 根据 cache_args 生成缓存唯一缓存 id，这是一个参数名集合
     :param expire: 缓存过期时间（秒）,默认 600 秒
+    :param local_size: 该接口进程内缓存的最大条目数，为0时不使用进程内缓存
+    :param stale: 过期后仍可返回旧结果的时间（秒），默认为0，即过期后同步重新获取
     """
 
     def decorator(f):
+        local = LocalCache(f.__module__ + '.' + f.__name__, local_size)
+
+        def store(cache_key_md5: str, res: dict):
+            # Redis中保留到旧结果不再可用为止，进程内缓存只保存未过期的结果
+            redis_cache.set(cache_key_md5, json.dumps(res), ex=expire + stale)
+            local.set(cache_key_md5, res, min(expire, local_cache_max_ttl))
+            publish_invalidation(cache_key_md5)
+
+        def refresh(cache_key: str, cache_key_md5: str, token_name, args, kwargs):
+            # 在请求上下文的副本中运行，g 为新的对象，重新设置请求的总耗时上限
+            g.values = {'code': 0}
+            g.token_name = token_name
+            deadline.start(request_deadline)
+            try:
+                res = f(*args, **kwargs)
+            except Exception as e:
+                metrics.incr('cache.refresh.failure')
+                logging.warning("后台刷新缓存 %s 失败，继续使用旧的结果: %s", unquote(cache_key), e)
+                return
+            if res.get('code', -1) != 0:
+                metrics.incr('cache.refresh.failure')
+                logging.warning("后台刷新缓存 %s 失败，继续使用旧的结果: %s", unquote(cache_key),
+                                res.get('message') or res.get('msg'))
+                return
+            store(cache_key_md5, res)
+            # 刷新成功后释放锁；失败时锁在过期前阻止重复刷新
+            redis_cache.delete('refreshing:' + cache_key_md5)
+            metrics.incr('cache.refresh.success')
+            logging.info("后台刷新缓存 %s", unquote(cache_key))
+
         @wraps(f)
         # 保持原有name
         def decorated_function(*args, **kwargs) -> dict:
@@ -41,22 +82,47 @@ def cache(cache_args: set, expire: int = 600):
                 cache_key = request.path
             # md5加密生成缓存键
             cache_key_md5 = hashlib.md5(cache_key.encode()).hexdigest()
-            # 从Redis取出缓存
-            cached = redis_cache.get(cache_key_md5)
+            # 先从进程内缓存取出
+            start_listener()
+            res = local.get(cache_key_md5)
+            if res is not None:
+                metrics.incr('cache.local.hit')
+                g.values['cached'] = True
+                g.values['code'] = 0
+                logging.info("命中缓存 %s", unquote(cache_key))
+                return res
+            metrics.incr('cache.local.miss')
+            # 从Redis取出缓存及其剩余有效期
+            pipe = redis_cache.pipeline()
+            pipe.get(cache_key_md5)
+            pipe.ttl(cache_key_md5)
+            cached, ttl = pipe.execute()
             if cached:
                 # 缓存命中，设置标记并返回缓存结果
+                metrics.incr('cache.redis.hit')
                 g.values['cached'] = True
                 g.values['code'] = 0
                 logging.info("命中缓存 %s", unquote(cache_key))
-                return json.loads(cached)
+                res = json.loads(cached)
+                if not stale or ttl > stale:
+                    local.set(cache_key_md5, res, min(ttl - stale, local_cache_max_ttl))
+                    return res
+                # 已过期但仍在可返回旧结果的时间内，由获得锁的请求在后台刷新
+                metrics.incr('cache.stale')
+                g.values['stale'] = True
+                if redis_cache.set('refreshing:' + cache_key_md5, 1, nx=True, ex=request_deadline):
+                    gevent.spawn(copy_current_request_context(refresh), cache_key, cache_key_md5,
+                                 g.get('token_name'), args, kwargs)
+                return dict(res, stale=True)
             else:
+                metrics.incr('cache.redis.miss')
                 # 缓存未命中，执行原函数
                 res: dict = f(*args, **kwargs)
                 g.values['code'] = res.get('code', -1)
                 # 只有成功的响应才会被缓存
                 if res.get('code', -1) == 0:
                     # 设置缓存，并指定过期时间
-                    redis_cache.set(cache_key_md5, json.dumps(res), ex=expire)
+                    store(cache_key_md5, res)
                     logging.info("缓存 %s", unquote(cache_key))
                 return res
 
@@ -0,0 +1,104 @@
+import contextvars
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import gevent
+from requests import Response
+
+from global_config import hedge_max_ratio, hedge_min_delay, hedge_min_samples, hedge_percentile
+from utils import metrics
+from utils.session import session
+
+# 各主机最近成功请求的耗时（秒）
+_latencies: Dict[str, Deque[float]] = {}
+# 当前统计窗口的开始时间、窗口内的请求数和对冲请求数，用于限制对冲带来的额外请求量
+_window = {'start': 0.0, 'requests': 0, 'hedges': 0}
+# 统计窗口长度（秒）
+_window_length = 60
+
+
+def hedge_delay(host: str) -> Optional[float]:
+    """
+    根据该主机最近请求耗时的分位数计算发出对冲请求前的等待时间
+
+    :param host: 主机名
+    :return: 等待时间（秒），样本不足时返回None，表示不对冲
+    """
+    samples = _latencies.get(host)
+    if not samples or len(samples) < hedge_min_samples:
+        return None
+    ordered = sorted(samples)
+    return max(ordered[min(int(len(ordered) * hedge_percentile), len(ordered) - 1)], hedge_min_delay)
+
+
+def _record_latency(host: str, elapsed: float):
+    _latencies.setdefault(host, deque(maxlen=200)).append(elapsed)
+
+
+def _acquire_hedge() -> bool:
+    """
+    判断是否还能发出对冲请求，对冲请求数不超过窗口内请求数的 hedge_max_ratio
+
+    :return: 是否允许对冲
+    """
+    if _window['hedges'] + 1 > max(_window['requests'] * hedge_max_ratio, 1):
+        return False
+    _window['hedges'] += 1
+    return True
+
+
+def _count_request():
+    now = time.time()
+    if now - _window['start'] >= _window_length:
+        _window.update(start=now, requests=0, hedges=0)
+    _window['requests'] += 1
+
+
+def hedged_request(method: str, url: str, **kwargs) -> Response:
+    """
+    发起可对冲的请求，只应用于幂等的查询请求
+
+    第一次请求在该主机最近耗时的 hedge_percentile 分位数内未返回时，再发出一次相同的请求，
+    采用先成功返回的结果并取消另一个请求；对冲请求的总量受 hedge_max_ratio 限制
+
+    :param method: HTTP请求方法
+    :param url: 请求URL
+    :param kwargs: 其他传递给session.request的参数
+    :return: 响应对象
+    """
+    host = urlsplit(url).netloc
+    _count_request()
+
+    def attempt():
+        start = time.time()
+        response = session.request(method, url, **kwargs)
+        _record_latency(host, time.time() - start)
+        return response
+
+    delay = hedge_delay(host)
+    if delay is None:
+        return attempt()
+
+    # 新的协程不继承上下文变量，在当前上下文的副本中运行，与本次请求共享 g，使请求的总耗时上限同样生效
+    first = gevent.spawn(contextvars.copy_context().run, attempt)
+    first.join(timeout=delay)
+    if first.ready():
+        return first.get()
+    if not _acquire_hedge():
+        metrics.incr('hedge.{}.capped'.format(host))
+        return first.get()
+
+    metrics.incr('hedge.{}.sent'.format(host))
+    second = gevent.spawn(contextvars.copy_context().run, attempt)
+    pending = [first, second]
+    while pending:
+        done = gevent.wait(pending, count=1)[0]
+        pending.remove(done)
+        if done.successful() or not pending:
+            for other in pending:
+                other.kill(block=False)
+            if done is second and done.successful():
+                metrics.incr('hedge.{}.won'.format(host))
+            return done.get()
@@ -0,0 +1,97 @@
+import hashlib
+from typing import Optional
+
+from requests import PreparedRequest, Response
+
+from global_config import http_cache_expire
+from utils import metrics
+from utils.redis_connections import redis_http_cache
+
+# 从缓存返回时恢复的响应头
+_cached_headers = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+def _cache_key(request: PreparedRequest) -> str:
+    return "http_cache:" + hashlib.sha1(request.url.encode()).hexdigest()
+
+
+def cacheable(request: PreparedRequest, paths) -> bool:
+    """
+    :param request: 即将发送的请求
+    :param paths: 启用缓存的路径前缀
+    :return: 该请求是否使用条件请求缓存
+    """
+    if request.method != 'GET' or not paths:
+        return False
+    # 携带Cookie的请求通常是需要登录的个人页面，不缓存，避免个人数据在会话失效后仍长期留在Redis中
+    if 'Cookie' in request.headers:
+        return False
+    if 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+        return False
+    path = request.path_url
+    return any(path.startswith(prefix) for prefix in paths)
+
+
+def prepare(request: PreparedRequest) -> Optional[dict]:
+    """
+    查找请求的缓存，存在时为请求添加 If-None-Match / If-Modified-Since 请求头
+
+    :param request: 即将发送的请求
+    :return: 缓存的响应，包含 body 及缓存的响应头，不存在时返回None
+    """
+    entry = redis_http_cache.hgetall(_cache_key(request))
+    if not entry or b'body' not in entry:
+        return None
+    entry = {key.decode(): value for key, value in entry.items()}
+    if 'ETag' in entry:
+        request.headers['If-None-Match'] = entry['ETag'].decode()
+    if 'Last-Modified' in entry:
+        request.headers['If-Modified-Since'] = entry['Last-Modified'].decode()
+    return entry
+
+
+def handle(upstream: str, request: PreparedRequest, response: Response, entry: Optional[dict]) -> Response:
+    """
+    处理条件请求的响应：304时用缓存的内容补全响应，200且带有校验信息时写入缓存
+
+    :param upstream: 上游系统名称
+    :param request: 已发送的请求
+    :param response: 响应对象，内容尚未被读取
+    :param entry: prepare 返回的缓存
+    :return: 处理后的响应对象
+    """
+    key = _cache_key(request)
+    if response.status_code == 304 and entry is not None:
+        # 读取空的响应体，使连接归还连接池
+        response.content
+        body = entry['body']
+        response.status_code = 200
+        response.reason = 'OK'
+        response._content = body
+        response._content_consumed = True
+        for header in _cached_headers:
+            if header in entry:
+                response.headers[header] = entry[header].decode()
+        response.headers['Content-Length'] = str(len(body))
+        response.headers.pop('Content-Encoding', None)
+        redis_http_cache.expire(key, http_cache_expire)
+        metrics.incr('http.' + upstream + '.cache.hit')
+        metrics.incr('http.' + upstream + '.cache.bytes_saved', len(body))
+        return response
+
+    body = response.content
+    metrics.incr('http.' + upstream + '.cache.miss')
+    metrics.incr('http.' + upstream + '.cache.bytes_downloaded', len(body))
+    validators = {header: response.headers[header] for header in ('ETag', 'Last-Modified') if header in response.headers}
+    if response.status_code != 200 or not validators or 'no-store' in response.headers.get('Cache-Control', ''):
+        return response
+    mapping = {'body': body, **validators}
+    if 'Content-Type' in response.headers:
+        mapping['Content-Type'] = response.headers['Content-Type']
+    pipe = redis_http_cache.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, http_cache_expire)
+    pipe.execute()
+    metrics.incr('http.' + upstream + '.cache.stored')
+    return response
@@ -0,0 +1,104 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import gevent
+
+from utils.redis_connections import redis_cache
+
+# 缓存失效通知的频道
+invalidation_channel = 'cache_invalidate'
+# 本进程的标识，忽略自己发出的失效通知
+_worker_id = uuid.uuid4().hex
+# 所有进程内缓存，收到失效通知时逐个删除
+_instances: List['LocalCache'] = []
+_listener = None
+
+
+class LocalCache:
+    """
+    进程内的LRU缓存，条目按各自的过期时间失效，超出 maxsize 时淘汰最久未使用的条目
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        _instances.append(self)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        :param key: 缓存键
+        :return: 缓存的值，不存在或已过期时返回None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expire: float):
+        """
+        :param key: 缓存键
+        :param value: 缓存的值
+        :param expire: 过期时间（秒）
+        """
+        if self.maxsize <= 0 or expire <= 0:
+            return
+        self._entries[key] = (value, time.time() + expire)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def publish_invalidation(key: str):
+    """
+    通知其他进程删除进程内缓存中的条目
+
+    :param key: 缓存键
+    """
+    redis_cache.publish(invalidation_channel, _worker_id + ':' + key)
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = redis_cache.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(invalidation_channel)
+            for message in pubsub.listen():
+                sender, _, key = message['data'].partition(':')
+                if sender == _worker_id:
+                    continue
+                for instance in _instances:
+                    instance.delete(key)
+        except Exception as e:
+            logging.warning("缓存失效通知订阅中断: %s", e)
+            gevent.sleep(1)
+
+
+def start_listener():
+    """
+    在后台订阅缓存失效通知，只启动一次
+    """
+    global _listener
+    if _listener is None:
+        _listener = gevent.spawn(_listen)
+
+
+def stats() -> dict:
+    """
+    :return: 各进程内缓存的条目数及容量
+    """
+    return {instance.name: {'size': len(instance), 'maxsize': instance.maxsize} for instance in _instances}
@@ -0,0 +1,36 @@
+from collections import defaultdict
+from typing import Dict, Union
+
+# 进程内计数器，名称 -> 计数
+_counters: Dict[str, Union[int, float]] = defaultdict(int)
+
+
+def incr(name: str, amount: Union[int, float] = 1):
+    """
+    增加计数器的值
+
+    :param name: 计数器名称，使用点号分隔模块和指标，如 login_failure_cache.hit
+    :param amount: 增加的数量
+    """
+    _counters[name] += amount
+
+
+def observe(name: str, value: float):
+    """
+    记录一次观测值，累加到 name.count 和 name.sum 两个计数器，二者相除即为平均值
+
+    :param name: 指标名称，如 lab_sso.hop.cas.ms
+    :param value: 观测值
+    """
+    _counters[name + '.count'] += 1
+    _counters[name + '.sum'] += value
+
+
+def snapshot(prefix: str = '') -> Dict[str, Union[int, float]]:
+    """
+    获取计数器的当前值
+
+    :param prefix: 只返回以此前缀开头的计数器
+    :return: 计数器名称到计数的字典
+    """
+    return {name: value for name, value in _counters.items() if name.startswith(prefix)}
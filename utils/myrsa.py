@@ -1,5 +1,20 @@
+import hashlib
+import time
+from collections import OrderedDict
+
 import rsa
 
+# 公钥缓存的有效期（秒），过期后重新根据模数和指数构建公钥对象
+key_cache_ttl = 3600
+# 密文缓存的最大条目数，超出后淘汰最久未使用的条目
+cipher_cache_size = 1024
+
+# 公钥缓存，(模数, 指数) -> (公钥对象, 密钥字节长度, 构建时间)
+_key_cache = {}
+# 密文缓存，sha256(模数, 指数, 明文) -> 16进制密文
+# 填充方式是确定的（全零填充，无随机数），同一公钥和明文的密文始终相同
+_cipher_cache = OrderedDict()
+
 
 class Encrypt(object):
     def __init__(self, e, m):
@@ -7,20 +22,35 @@ class Encrypt(object):
         self.m = m
 
     def encrypt(self, message):
-        # 转换为十进制
-        mm = int(self.m, 16)
-        ee = int(self.e, 16)
-        # 创建一个公钥对象
-        rsa_pubkey = rsa.PublicKey(mm, ee)
+        # 命中密文缓存时直接返回，缓存键只保存明文的哈希值
+        digest = hashlib.sha256('{}:{}:{}'.format(self.m, self.e, message).encode()).digest()
+        crypto_hex = _cipher_cache.get(digest)
+        if crypto_hex is not None:
+            _cipher_cache.move_to_end(digest)
+            return crypto_hex
+        rsa_pubkey, keylength = self._public_key()
         # 加密
-        crypto = self._encrypt(message.encode(), rsa_pubkey)
+        crypto = self._encrypt(message.encode(), rsa_pubkey, keylength)
         # 转换为16进制
-        return crypto.hex()
+        crypto_hex = crypto.hex()
+        _cipher_cache[digest] = crypto_hex
+        if len(_cipher_cache) > cipher_cache_size:
+            _cipher_cache.popitem(last=False)
+        return crypto_hex
 
-
-    def _encrypt(self, message, pub_key):
+    def _public_key(self):
+        # 按模数和指数缓存公钥对象及密钥长度，过期后重新构建
+        cached = _key_cache.get((self.m, self.e))
+        if cached is not None and time.time() - cached[2] < key_cache_ttl:
+            return cached[0], cached[1]
+        # 转换为十进制，创建一个公钥对象
+        rsa_pubkey = rsa.PublicKey(int(self.m, 16), int(self.e, 16))
         # 确定密钥长度
-        keylength = rsa.common.byte_size(pub_key.n)
+        keylength = rsa.common.byte_size(rsa_pubkey.n)
+        _key_cache[(self.m, self.e)] = (rsa_pubkey, keylength, time.time())
+        return rsa_pubkey, keylength
+
+    def _encrypt(self, message, pub_key, keylength):
         # 根据密钥长度填充消息
         padded = self._pad_for_encryption(message, keylength)
         # 字符串转换为整数，因为加密需要整数
@@ -44,14 +74,10 @@ class Encrypt(object):
         message = message[::-1]
         msglength = len(message)
 
-        padding = b''
         # 算出需要填充的字节数，3是padding需要占用3个字节
         padding_length = target_length - msglength - 3
 
-        for i in range(padding_length):
-            padding += b'\x00'
-
-        return b''.join([b'\x00\x00', padding, b'\x00', message])
+        return b''.join([b'\x00\x00', b'\x00' * padding_length, b'\x00', message])
 
 # password = '%B7'
 # print(Encrypt('10001', 'e9a315bf6d72428bf7d03d52f2f12418f3ed692703f572650d9f996b68be21fedb48805228619574a9df13393f6ea06ae929f64a88fd1edaf4489016caa5d779').encrypt(password[::-1]))
\ No newline at end of file
@@ -2,24 +2,44 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import random
+from http import cookiejar
+from typing import Dict, Iterable, List, Optional, Tuple, Union, Any
+
 import requests
-import os
-from typing import Dict, List, Optional, Union, Any
+from requests.adapters import HTTPAdapter
 
-from global_config import proxy_list, proxy_rotation_policy, proxy_request_timeout, proxy_retry_delay
+from global_config import enableProxy, proxy_ewma_alpha, proxy_list, proxy_pool_maxsize, proxy_rotation_policy, \
+    proxy_request_timeout, proxy_retry_delay
 
 class ProxyManager:
     """
     代理管理器
     用于管理多个代理服务器并提供简单的代理切换功能
+
+    每个代理使用独立的会话和连接池，保持与代理之间的长连接；
+    utils.session 中的上游请求同样经由代理管理器选择的代理发出，不再依赖进程的 http_proxy 环境变量
+
+    每次上游请求按 proxy_rotation_policy 选择代理：
+    - round_robin: 使用当前代理，保活失败时切换到下一个
+    - random: 随机选择
+    - ewma: 按该上游经由各代理的延迟和错误率的指数加权平均值加权随机选择，慢的代理分到较少的请求
+    - least_in_flight: 选择正在进行的请求最少的代理，相同时选择ewma权重较高的
+    - sticky: 每个上游固定使用一个按ewma选出的代理，该代理请求失败后重新选择
     """
     
     def __init__(self):
         """
         初始化代理管理器
         """
-        # 格式化代理列表，将配置转换为请求库可用的格式
-        self.formatted_proxies = self._format_proxies(proxy_list)
+        # 格式化代理列表，将配置转换为请求库可用的格式，禁用代理时直接连接
+        self.formatted_proxies = self._format_proxies(proxy_list) if enableProxy else []
+        # 代理名称（不含认证信息），用于日志和状态展示
+        self.proxy_names = [f"{config.get('type', 'http').lower()}://{config['url']}"
+                            for config in proxy_list if config and config.get('url')] if enableProxy else []
+        # 每个代理的会话，以及不使用代理时的会话
+        self.sessions = [self._create_session(proxy) for proxy in self.formatted_proxies]
+        self.direct_session = self._create_session({})
         
         # 检查代理列表是否为空
         if not self.formatted_proxies:
@@ -29,9 +49,16 @@ class ProxyManager:
         
         # 当前使用的代理索引
         self.current_proxy_index = 0
+        # 各代理正在进行的请求数
+        self.in_flight = [0] * len(self.formatted_proxies)
+        # (代理索引, 上游系统) -> 请求延迟（秒）和失败率的指数加权平均值
+        self.latency: Dict[Tuple[int, str], float] = {}
+        self.errors: Dict[Tuple[int, str], float] = {}
+        # sticky 策略下各上游系统固定使用的代理索引
+        self.sticky: Dict[str, int] = {}
         
-        # 设置系统代理（设置为第一个代理）
-        self._set_system_proxy(0)
+        # 使用第一个代理
+        self._select_proxy(0)
     
     def _format_proxies(self, proxy_configs: List[Dict[str, str]]) -> List[Dict[str, Dict[str, str]]]:
         """
@@ -68,49 +95,227 @@ class ProxyManager:
             
         return formatted_list
     
-    def _set_system_proxy(self, index: int) -> bool:
+    @staticmethod
+    def _create_session(proxy: Dict[str, str]) -> requests.Session:
         """
-        设置系统代理环境变量
-        
+        创建使用指定代理的会话，连接池大小受 proxy_pool_maxsize 限制
+
+        Args:
+            proxy: requests格式的代理配置，为空表示直接连接
+
+        Returns:
+            会话对象
+        """
+        proxy_session = requests.Session()
+        # 只使用指定的代理，忽略环境变量中的代理设置
+        proxy_session.trust_env = False
+        proxy_session.proxies = dict(proxy)
+        # 不保存任何Cookie，每次请求与单独发出时一致
+        proxy_session.cookies.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_maxsize=proxy_pool_maxsize)
+        proxy_session.mount('http://', adapter)
+        proxy_session.mount('https://', adapter)
+        return proxy_session
+
+    def _select_proxy(self, index: int) -> bool:
+        """
+        选择当前使用的代理
+
         Args:
             index: 代理在列表中的索引
-            
+
         Returns:
-            是否成功设置
+            是否成功选择
         """
         if not self.formatted_proxies or index >= len(self.formatted_proxies):
-            # 清除系统代理
-            if "http_proxy" in os.environ:
-                del os.environ["http_proxy"]
-            if "https_proxy" in os.environ:
-                del os.environ["https_proxy"]
             return False
-        
-        # 获取指定索引的代理
-        proxy = self.formatted_proxies[index]
-        
-        # 从代理字典中提取URL(去掉协议前缀)
-        proxy_url = proxy.get("http", "")
-        if "://" in proxy_url:
-            proxy_url = proxy_url.split("://", 1)[1]
-        
-        # 提取代理类型
-        proxy_type = "http"  # 默认类型
-        for p_type in ["http", "https", "socks5", "socks4"]:
-            if p_type in proxy.get("http", ""):
-                proxy_type = p_type
-                break
-        
-        # 设置系统代理环境变量
-        os.environ["http_proxy"] = f"{proxy_type}://{proxy_url}"
-        os.environ["https_proxy"] = f"{proxy_type}://{proxy_url}"
-        
+
         # 更新当前使用的代理索引
         self.current_proxy_index = index
-        
-        logging.info(f"已将系统代理设置为 #{index+1}: {proxy_type}://{proxy_url}")
+
+        logging.info(f"已将当前代理设置为 #{index+1}: {self.proxy_names[index]}")
         return True
-    
+
+    def current_proxies(self) -> Dict[str, str]:
+        """
+        获取当前使用的代理
+
+        Returns:
+            requests格式的代理配置，没有代理时返回空字典
+        """
+        if not self.formatted_proxies:
+            return {}
+        return self.formatted_proxies[self.current_proxy_index]
+
+    def current_session(self) -> requests.Session:
+        """
+        获取当前代理的会话
+
+        Returns:
+            会话对象，没有代理时返回直接连接的会话
+        """
+        if not self.formatted_proxies:
+            return self.direct_session
+        return self.sessions[self.current_proxy_index]
+
+    def _weight(self, index: int, upstream: str) -> float:
+        """
+        计算代理对某个上游系统的权重，延迟越低、失败率越低权重越高
+
+        Args:
+            index: 代理索引
+            upstream: 上游系统名称
+
+        Returns:
+            权重，没有样本的代理按其他代理的平均延迟计算，保证新代理也能分到请求
+        """
+        latency = self.latency.get((index, upstream))
+        if latency is None:
+            known = [value for (_, name), value in self.latency.items() if name == upstream]
+            latency = sum(known) / len(known) if known else 1.0
+        # 持续失败的代理仍保留少量请求，以便恢复后重新获得流量
+        return max(1 - self.errors.get((index, upstream), 0.0), 0.02) / max(latency, 0.001)
+
+    def _weighted_choice(self, upstream: str) -> int:
+        indexes = range(len(self.formatted_proxies))
+        return random.choices(indexes, weights=[self._weight(index, upstream) for index in indexes])[0]
+
+    def select(self, upstream: str = 'default') -> Optional[int]:
+        """
+        按 proxy_rotation_policy 为一次上游请求选择代理
+
+        Args:
+            upstream: 上游系统名称
+
+        Returns:
+            代理索引，没有代理时返回None
+        """
+        if not self.formatted_proxies:
+            return None
+        if proxy_rotation_policy == 'random':
+            return random.randrange(len(self.formatted_proxies))
+        if proxy_rotation_policy == 'ewma':
+            return self._weighted_choice(upstream)
+        if proxy_rotation_policy == 'least_in_flight':
+            return min(range(len(self.formatted_proxies)),
+                       key=lambda index: (self.in_flight[index], -self._weight(index, upstream)))
+        if proxy_rotation_policy == 'sticky':
+            if upstream not in self.sticky:
+                self.sticky[upstream] = self._weighted_choice(upstream)
+            return self.sticky[upstream]
+        return self.current_proxy_index
+
+    def best_proxy(self, upstream: str = 'default') -> Optional[int]:
+        """
+        Args:
+            upstream: 上游系统名称
+
+        Returns:
+            该上游权重最高的代理索引，没有代理时返回None
+        """
+        if not self.formatted_proxies:
+            return None
+        return max(range(len(self.formatted_proxies)), key=lambda index: self._weight(index, upstream))
+
+    def proxies_at(self, index: Optional[int]) -> Dict[str, str]:
+        """
+        Args:
+            index: 代理索引
+
+        Returns:
+            requests格式的代理配置，索引为None时返回空字典
+        """
+        return {} if index is None else self.formatted_proxies[index]
+
+    def begin(self, index: Optional[int]):
+        """
+        记录经由代理的请求开始
+
+        Args:
+            index: 代理索引
+        """
+        if index is not None:
+            self.in_flight[index] += 1
+
+    def finish(self, index: Optional[int], upstream: str, elapsed: float, failed: Optional[bool]):
+        """
+        记录经由代理的请求结束，更新该上游经由此代理的延迟和失败率
+
+        Args:
+            index: 代理索引
+            upstream: 上游系统名称
+            elapsed: 请求耗时（秒）
+            failed: 是否因连接失败或超时而失败，为None时不计入统计（如因请求剩余时间不足而超时）
+        """
+        if index is None:
+            return
+        self.in_flight[index] -= 1
+        if failed is not None:
+            self.record(index, upstream, elapsed, failed)
+
+    def record(self, index: int, upstream: str, elapsed: float, failed: bool):
+        """
+        更新某个上游经由代理的延迟和失败率，用于上游请求结束及健康探测
+
+        Args:
+            index: 代理索引
+            upstream: 上游系统名称
+            elapsed: 请求耗时（秒）
+            failed: 是否失败
+        """
+        key = (index, upstream)
+        self.errors[key] = (1 - proxy_ewma_alpha) * self.errors.get(key, 0.0) + proxy_ewma_alpha * failed
+        if failed:
+            if self.sticky.get(upstream) == index:
+                del self.sticky[upstream]
+        elif key in self.latency:
+            self.latency[key] = (1 - proxy_ewma_alpha) * self.latency[key] + proxy_ewma_alpha * elapsed
+        else:
+            self.latency[key] = elapsed
+
+    def stats(self, adapters: Iterable[HTTPAdapter] = ()) -> List[Dict[str, Any]]:
+        """
+        统计经由各代理的请求数和新建连接数
+
+        Args:
+            adapters: 同样经由代理发出请求的其他连接适配器，如 utils.session 中各上游系统的适配器
+
+        Returns:
+            各代理的统计，reuseRatio 为复用已有连接的请求所占比例，upstreams 为各上游系统经由该代理的延迟和失败率
+        """
+        adapters = list(adapters)
+        result = []
+        for index, proxy in enumerate(self.formatted_proxies):
+            proxy_url = proxy['http']
+            managers = [adapter.proxy_manager[proxy_url]
+                        for adapter in adapters + [self.sessions[index].get_adapter('http://')]
+                        if proxy_url in adapter.proxy_manager]
+            request_count = connection_count = 0
+            for manager in managers:
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool is not None:
+                        request_count += pool.num_requests
+                        connection_count += pool.num_connections
+            # 状态接口无需认证，只展示代理序号，不暴露代理地址
+            result.append({
+                'proxy': f'#{index+1}',
+                'current': index == self.current_proxy_index,
+                'requests': request_count,
+                'connectionsCreated': connection_count,
+                'reuseRatio': round(1 - connection_count / request_count, 3) if request_count else None,
+                'inFlight': self.in_flight[index],
+                'upstreams': {
+                    upstream: {
+                        'latency': round(self.latency[(i, upstream)], 3) if (i, upstream) in self.latency else None,
+                        'errorRate': round(self.errors.get((i, upstream), 0.0), 3),
+                        'weight': round(self._weight(i, upstream), 3),
+                    }
+                    for i, upstream in self.errors if i == index
+                },
+            })
+        return result
+
     def switch_to_next_proxy(self) -> bool:
         """
         切换到下一个代理
@@ -124,8 +329,7 @@ class ProxyManager:
         # 计算下一个代理的索引
         next_index = (self.current_proxy_index + 1) % len(self.formatted_proxies)
         
-        # 设置为系统代理
-        success = self._set_system_proxy(next_index)
+        success = self._select_proxy(next_index)
         
         return success
     
@@ -142,11 +346,11 @@ class ProxyManager:
         if not self.formatted_proxies or index >= len(self.formatted_proxies):
             return False
         
-        return self._set_system_proxy(index)
+        return self._select_proxy(index)
     
     def make_request(self, method: str, url: str, **kwargs) -> requests.Response:
         """
-        使用当前系统代理发送请求
+        使用当前代理的会话发送请求，复用与代理之间的连接
         
         Args:
             method: HTTP请求方法 (get, post等)
@@ -161,24 +365,13 @@ class ProxyManager:
         """
         # 如果没有代理，直接发出请求
         if not self.formatted_proxies:
-            return requests.request(method, url, **kwargs)
+            return self.direct_session.request(method, url, **kwargs)
         
         # 设置超时时间，避免请求卡死
         timeout = kwargs.pop('timeout', proxy_request_timeout)
         
-        # 获取当前代理
-        current_proxy = self.formatted_proxies[self.current_proxy_index]
-        
-        # 发送请求
-        response = requests.request(
-            method, 
-            url, 
-            proxies=current_proxy, 
-            timeout=timeout, 
-            **kwargs
-        )
-        
-        return response
+        # 使用当前代理的会话发送请求
+        return self.current_session().request(method, url, timeout=timeout, **kwargs)
     
     def get(self, url: str, **kwargs) -> requests.Response:
         """
@@ -14,7 +14,7 @@ redis_token = redis.StrictRedis(host=redis_config['host'], port=redis_config['po
                                 encoding='utf8', decode_responses=True, db=1)
 
 # Redis连接实例 - 用于存储用户会话信息
-# 使用db=2数据库，不自动解码响应（用于存储二进制数据如pickle序列化的对象）
+# 使用db=2数据库，不自动解码响应（用于存储序列化的Cookie等二进制数据）
 redis_session = redis.StrictRedis(host=redis_config['host'], port=redis_config['port'],
                                   password=redis_config['password'],
                                   encoding='utf8', decode_responses=False, db=2)
@@ -28,3 +28,8 @@ redis_cache = redis.StrictRedis(host=redis_config['host'], port=redis_config['po
 # 使用db=4数据库，不自动解码响应（用于存储二进制数据）
 redis_experiment = redis.StrictRedis(host=redis_config['host'], port=redis_config['port'],
                                      password=redis_config['password'], encoding='utf8', decode_responses=False, db=4)
+
+# Redis连接实例 - 用于上游页面的HTTP条件请求缓存
+# 使用db=5数据库，不自动解码响应（用于存储页面原始内容）
+redis_http_cache = redis.StrictRedis(host=redis_config['host'], port=redis_config['port'],
+                                     password=redis_config['password'], encoding='utf8', decode_responses=False, db=5)
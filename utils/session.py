@@ -1,17 +1,225 @@
+import codecs
+import random
+import re
+import time
 from http import cookiejar  # Python 2: import cookielib as cookiejar
+from typing import Dict, Optional
+from urllib.parse import urlsplit
 
 import requests
+from requests import Response
 from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from global_config import upstream_clients
+from utils import deadline, http_cache, metrics
+from utils.circuit_breaker import HALF_OPEN, CircuitOpenError, get_breaker
+from utils.proxy_manager import proxy_manager
+
+
+class _TimedPool:
+    """记录获取连接的等待时间及连接池溢出次数的连接池"""
+    upstream = 'default'
+
+    def _get_conn(self, timeout=None):
+        start = time.time()
+        try:
+            return super()._get_conn(timeout)
+        finally:
+            metrics.observe('http.' + self.upstream + '.pool_wait.ms', (time.time() - start) * 1000)
+
+    def _put_conn(self, conn):
+        if self.pool is not None and self.pool.full():
+            metrics.incr('http.' + self.upstream + '.pool_overflow')
+        return super()._put_conn(conn)
+
+
+class IdempotentRetry(Retry):
+    """
+    只重试幂等请求的重试策略，重试间隔按指数退避并加入随机抖动，且不超过请求剩余的时间
+    """
+
+    def increment(self, method=None, *args, **kwargs):
+        if method and method.upper() not in Retry.DEFAULT_ALLOWED_METHODS:
+            # 非幂等请求不重试，直接按重试次数用尽处理
+            return Retry.increment(self.new(total=0), method, *args, **kwargs)
+        return super().increment(method, *args, **kwargs)
+
+    def get_backoff_time(self) -> float:
+        backoff = random.uniform(0, super().get_backoff_time())
+        left = deadline.remaining()
+        return backoff if left is None else max(min(backoff, left), 0)
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """
+    单个上游系统的连接适配器，使用独立的连接池，并为请求补充默认超时时间和请求头
+
+    按主机记录响应传输的字节数（压缩后）和解压后的字节数
+    """
+
+    def __init__(self, name: str, timeout=None, headers: Optional[dict] = None, retries: int = 0,
+                 backoff: float = 0.2, pool_maxsize: int = 10, pool_block: bool = False, http_cache=None):
+        self.name = name
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.pool_maxsize = pool_maxsize
+        # 启用HTTP条件请求缓存的路径前缀
+        self.http_cache = http_cache or []
+        # 正在进行及同时进行的最大请求数
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # 只重试幂等请求的连接失败，读取超时不重试，避免重复提交请求并超出请求的总耗时上限
+        super().__init__(pool_maxsize=pool_maxsize, pool_block=pool_block,
+                         max_retries=IdempotentRetry(total=retries, read=False, backoff_factor=backoff))
+
+    def _timed_pool_classes(self, pool_classes: dict) -> dict:
+        return {scheme: type(pool_class.__name__, (_TimedPool, pool_class), {'upstream': self.name})
+                for scheme, pool_class in pool_classes.items()}
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._timed_pool_classes(
+            {'http': HTTPConnectionPool, 'https': HTTPSConnectionPool})
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        # 经由代理的连接池同样记录等待时间，每个代理的连接池相互独立
+        created = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if created:
+            manager.pool_classes_by_scheme = self._timed_pool_classes(manager.pool_classes_by_scheme)
+        return manager
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        # 未指定代理时经由代理管理器按策略选择的代理发出
+        proxy_index = None
+        if not kwargs.get('proxies'):
+            proxy_index = proxy_manager.select(self.name)
+            kwargs['proxies'] = proxy_manager.proxies_at(proxy_index)
+        for key, value in self.headers.items():
+            request.headers.setdefault(key, value)
+        if timeout is None:
+            timeout = self.timeout
+        # 请求设置了总耗时上限时，只使用剩余的时间
+        left = deadline.remaining()
+        connect_clamped = read_clamped = False
+        if left is not None:
+            if left <= 0:
+                deadline.abort(self.name, request.url)
+            clamped_timeout = deadline.clamp_timeout(timeout, left)
+            connect_clamped, read_clamped = deadline.clamped_parts(timeout, clamped_timeout)
+            timeout = clamped_timeout
+        # 熔断器打开时直接拒绝，按连接失败处理
+        breaker = get_breaker(urlsplit(request.url).hostname)
+        if not breaker.allow():
+            metrics.incr('http.' + self.name + '.rejected')
+            raise CircuitOpenError('{} 暂时无法访问'.format(breaker.host), request=request)
+        # 半开状态的探测请求未记录成功或失败就结束时必须归还探测名额，否则熔断器将一直拒绝该主机的请求
+        probe = breaker.state == HALF_OPEN
+        recorded = False
+        try:
+            cache_entry = None
+            use_cache = not stream and http_cache.cacheable(request, self.http_cache)
+            if use_cache:
+                cache_entry = http_cache.prepare(request)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            metrics.incr('http.' + self.name + '.requests')
+            proxy_manager.begin(proxy_index)
+            proxy_failed = False
+            start = time.time()
+            try:
+                response = super().send(request, stream=stream, timeout=timeout, **kwargs)
+            except requests.exceptions.Timeout as e:
+                # 因剩余时间不足导致的超时不计入主机和代理的失败，只看实际超时的连接或读取阶段是否被缩短
+                clamped = read_clamped if isinstance(e, requests.exceptions.ReadTimeout) else connect_clamped
+                if clamped:
+                    proxy_failed = None
+                else:
+                    breaker.record_failure()
+                    recorded = proxy_failed = True
+                raise
+            except requests.exceptions.ConnectionError:
+                breaker.record_failure()
+                recorded = proxy_failed = True
+                raise
+            finally:
+                self.in_flight -= 1
+                elapsed = time.time() - start
+                proxy_manager.finish(proxy_index, self.name, elapsed, proxy_failed)
+                deadline.record_hop(self.name, request.url, elapsed)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            recorded = True
+        finally:
+            if probe and not recorded:
+                breaker.release()
+        if not stream:
+            self._record_bytes(response)
+        if use_cache:
+            response = http_cache.handle(self.name, request, response, cache_entry)
+        return response
+
+    @staticmethod
+    def _record_bytes(response: Response):
+        """
+        读取响应内容，记录该主机传输的字节数（压缩后）和解压后的字节数
+
+        :param response: 响应对象
+        """
+        content = response.content
+        prefix = 'http.' + urlsplit(response.url).netloc + '.'
+        metrics.incr(prefix + 'bytes.wire', response.raw.tell())
+        metrics.incr(prefix + 'bytes.decoded', len(content))
+        metrics.incr(prefix + 'encoding.' + (response.headers.get('Content-Encoding') or 'identity'))
+
+    def stats(self) -> dict:
+        """
+        :return: 连接池的使用情况，包括直接连接及经由各代理的连接池，utilization 为正在进行的请求数占连接池大小的比例
+        """
+        idle = created = 0
+        for manager in [self.poolmanager] + list(self.proxy_manager.values()):
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is not None:
+                    # 队列中的None是尚未创建连接的占位
+                    idle += sum(conn is not None for conn in list(pool.pool.queue)) if pool.pool is not None else 0
+                    created += pool.num_connections
+        return {
+            'inFlight': self.in_flight,
+            'peakInFlight': self.peak_in_flight,
+            'poolMaxsize': self.pool_maxsize,
+            'utilization': round(self.in_flight / self.pool_maxsize, 3),
+            'idleConnections': idle,
+            'connectionsCreated': created,
+        }
+
 
 session = requests.Session()
-# adapter = HTTPAdapter(pool_connections=100, pool_maxsize=100, max_retries=3)
-# 设置最大请求数
-adapter = HTTPAdapter(max_retries=3)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
-session.timeout = 10  # 设置超时时间为10秒
-# 设置代理
-# session.proxies = proxies
+# 各上游系统的连接适配器，按 upstream_clients 配置创建并按主机挂载，未配置的主机使用 default
+adapters: Dict[str, UpstreamAdapter] = {}
+for _name, _options in upstream_clients.items():
+    _options = dict(_options)
+    _hosts = _options.pop('hosts', [])
+    adapters[_name] = UpstreamAdapter(_name, **_options)
+    for _host in _hosts:
+        session.mount('http://' + _host, adapters[_name])
+        session.mount('https://' + _host, adapters[_name])
+session.mount('http://', adapters['default'])
+session.mount('https://', adapters['default'])
+
+
+def pool_stats() -> Dict[str, dict]:
+    """
+    :return: 各上游系统连接池的使用情况
+    """
+    return {name: adapter.stats() for name, adapter in adapters.items()}
+
+# 代理由 UpstreamAdapter 按代理管理器当前选中的代理设置，不读取环境变量中的代理
+session.trust_env = False
 # 禁用 SSL 证书验证
 session.verify = False
 
@@ -24,3 +232,89 @@ class BlockAll(cookiejar.CookiePolicy):
 
 
 session.cookies.set_policy(BlockAll())
+
+
+# 未声明编码时依次尝试的编码
+fallback_encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030', 'latin1']
+# 各上游主机上次成功解码使用的编码，未声明编码时优先尝试
+_host_encodings: Dict[str, str] = {}
+# 声明为以下编码时按其超集解码，上游页面常声明gb2312却包含gbk字符
+_superset_encodings = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'iso-8859-1': 'cp1252', 'ascii': 'utf-8'}
+_header_charset_re = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+_meta_charset_re = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.I)
+
+
+def _normalize_encoding(name) -> Optional[str]:
+    if isinstance(name, bytes):
+        name = name.decode('ascii', 'ignore')
+    try:
+        name = codecs.lookup(name).name
+    except LookupError:
+        return None
+    return _superset_encodings.get(name, name)
+
+
+def declared_encoding(response: Response) -> Optional[str]:
+    """
+    获取响应声明的编码，依次查找 Content-Type 响应头和页面开头的 meta 标签
+
+    :param response: 响应对象
+    :return: 规范化后的编码名，未声明或无法识别时返回None
+    """
+    match = _header_charset_re.search(response.headers.get('Content-Type', ''))
+    if not match:
+        match = _meta_charset_re.search(response.content[:2048])
+    return _normalize_encoding(match.group(1)) if match else None
+
+
+def decode_response(response: Response) -> Optional[str]:
+    """
+    解码响应内容，同一个响应只解码一次
+
+    优先使用响应声明的编码，其次使用该主机上次成功的编码，最后依次尝试常见编码，
+    成功的编码会记录到对应主机。
+
+    :param response: 响应对象
+    :return: 解码后的文本，所有编码均失败时返回None
+    """
+    text = getattr(response, '_decoded_text', None)
+    if text is not None:
+        return text
+    host = urlsplit(response.url or '').netloc
+    candidates = [declared_encoding(response), _host_encodings.get(host)] + fallback_encodings
+    tried = set()
+    for encoding in candidates:
+        if not encoding or encoding in tried:
+            continue
+        tried.add(encoding)
+        try:
+            text = response.content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        _host_encodings[host] = encoding
+        response._decoded_text = text
+        return text
+    return None
+
+
+def response_contains(response: Response, *markers: str) -> bool:
+    """
+    判断响应内容是否包含任一标记文本
+
+    已知编码时直接在原始字节中查找编码后的标记，避免解码整个页面；
+    编码未知时退化为解码后查找。
+
+    :param response: 响应对象
+    :param markers: 标记文本
+    :return: 是否包含任一标记
+    """
+    text = getattr(response, '_decoded_text', None)
+    if text is None:
+        encoding = declared_encoding(response) or _host_encodings.get(urlsplit(response.url or '').netloc)
+        if encoding:
+            try:
+                return any(marker.encode(encoding) in response.content for marker in markers)
+            except UnicodeEncodeError:
+                pass
+        text = decode_response(response)
+    return text is not None and any(marker in text for marker in markers)
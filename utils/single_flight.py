@@ -0,0 +1,101 @@
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import gevent
+from gevent.event import AsyncResult
+from redis import RedisError, StrictRedis
+
+from utils import deadline
+
+# 本进程内正在执行的调用，key -> 等待结果的AsyncResult
+_inflight: Dict[str, AsyncResult] = {}
+
+# 仅当锁仍属于自己时才释放，避免误删其他进程重新获取的锁
+_release_script = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def single_flight(key: str, func: Callable[[], Any], redis_conn: StrictRedis,
+                  dumps: Optional[Callable[[Any], bytes]] = None, loads: Optional[Callable[[bytes], Any]] = None,
+                  lock_ttl: int = 30, wait_timeout: float = 30, poll_interval: float = 0.2) -> Any:
+    """
+    合并同一个key的并发调用，保证同一时刻只有一个调用真正执行
+
+    工作原理：
+    1. 本进程内已有相同key的调用在执行时，当前协程等待并复用其结果（包括异常）
+    2. 否则尝试获取Redis短锁，获取成功则执行调用，成功时将结果以 result:<key> 发布，结束后释放锁
+    3. 其他进程持有锁时轮询等待锁释放，然后只读取对方以同一key发布的结果
+    4. 等待超时、对方调用失败或未读取到结果时，退化为自行执行调用
+
+    :param key: 合并调用的唯一标识，应包含区分调用结果的全部信息（如密码摘要）
+    :param func: 真正执行的调用
+    :param redis_conn: 用于跨进程加锁的Redis连接
+    :param dumps: 序列化调用结果的函数，为None时不向其他进程发布结果
+    :param loads: 反序列化其他进程发布的结果的函数，为None时不读取，等待锁释放后自行执行调用
+    :param lock_ttl: Redis锁的过期时间（秒），防止进程崩溃后锁无法释放
+    :param wait_timeout: 等待其他调用完成的最长时间（秒）
+    :param poll_interval: 跨进程等待时轮询锁状态的间隔（秒）
+    :return: 调用结果
+    """
+    # 等待时间不超过当前请求剩余的时间
+    left = deadline.remaining()
+    if left is not None:
+        wait_timeout = max(min(wait_timeout, left), 0)
+    pending = _inflight.get(key)
+    if pending is not None:
+        try:
+            return pending.get(timeout=wait_timeout)
+        except gevent.Timeout:
+            logging.warning("等待 %s 的合并调用超时，自行执行", key)
+            return func()
+
+    result = AsyncResult()
+    _inflight[key] = result
+    try:
+        value = _run_with_lock(key, func, redis_conn, dumps, loads, lock_ttl, wait_timeout, poll_interval)
+    except BaseException as e:
+        result.set_exception(e)
+        raise
+    else:
+        result.set(value)
+        return value
+    finally:
+        _inflight.pop(key, None)
+
+
+def _run_with_lock(key: str, func: Callable[[], Any], redis_conn: StrictRedis,
+                   dumps: Optional[Callable[[Any], bytes]], loads: Optional[Callable[[bytes], Any]],
+                   lock_ttl: int, wait_timeout: float, poll_interval: float) -> Any:
+    lock_key = "lock:" + key
+    result_key = "result:" + key
+    token = uuid.uuid4().hex
+    if redis_conn.set(lock_key, token, nx=True, ex=lock_ttl):
+        try:
+            # 清除上一次调用发布的结果，等待者只会读到本次调用的结果
+            redis_conn.delete(result_key)
+            value = func()
+            if dumps is not None:
+                redis_conn.set(result_key, dumps(value), ex=lock_ttl)
+            return value
+        finally:
+            try:
+                redis_conn.eval(_release_script, 1, lock_key, token)
+            except RedisError as e:
+                # 释放失败时锁会在lock_ttl后自动过期，不影响本次调用结果
+                logging.warning("释放锁 %s 失败: %s", lock_key, e)
+
+    # 其他进程正在执行，等待其完成后读取结果
+    wait_until = time.time() + wait_timeout
+    while time.time() < wait_until and redis_conn.exists(lock_key):
+        gevent.sleep(poll_interval)
+    if loads is not None:
+        data = redis_conn.get(result_key)
+        if data is not None:
+            return loads(data)
+    return func()